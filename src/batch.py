@@ -0,0 +1,343 @@
+"""
+Batch mode for YouTube Video Finder
+Runs many queries concurrently with API rate limits and a daily quota budget
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from config_manager import CACHE_DIR, load_config, key_pool_from_config
+from youtube_search import (search_youtube, DEFAULT_QUOTA_BUDGET, DEFAULT_DEDUPE_THRESHOLD, DEFAULT_LANGUAGES,
+                            SEARCH_QUOTA_COST, VIDEOS_QUOTA_COST)
+from resilience import get_policy
+from llm_analysis import (analyze_titles_tournament, analyze_query_batch, DEFAULT_SHARD_SIZE, DEFAULT_PARALLELISM,
+                          DEFAULT_PROMPT_TOKEN_BUDGET)
+from ranking import best_local_video, DEFAULT_TOP_K
+from search_cache import cache_from_config
+from video_store import store_from_config
+from verdict_cache import verdict_cache_from_config
+
+QUOTA_USAGE_FILE = os.path.join(CACHE_DIR, "quota_usage.json")
+DEFAULT_WORKERS = 4
+DEFAULT_YOUTUBE_RATE = 5.0  # requests per second
+DEFAULT_GEMINI_RATE = 15 / 60  # requests per second (15 per minute)
+DEFAULT_DAILY_QUOTA = 10000  # YouTube Data API default daily quota
+DEFAULT_LLM_BATCH_SIZE = 4  # queries per Gemini request
+DEFAULT_LLM_BATCH_WAIT = 1.0  # seconds a partial batch waits for more queries
+CONFIG_RELOAD_INTERVAL = 60  # seconds between checks of config.json for new keys
+
+class RateLimiter:
+    """
+    Thread-safe token bucket limiting how often an API may be called
+
+    `rate` tokens are added per second up to `burst`; acquire() blocks until a token is available.
+    Set as a CallPolicy's limiter, it paces every request made to that API.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking=True):
+        """
+        Take a token, blocking until a call is allowed
+
+        Returns:
+            bool: True if a token was taken (always, unless blocking is False and none is available)
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                if not blocking:
+                    return False
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class QuotaScheduler:
+    """
+    Tracks YouTube quota units spent per day (Pacific time resets are approximated by UTC)
+
+    Usage is saved to `path` so several batch runs on the same day share one budget.
+    """
+
+    def __init__(self, daily_units=DEFAULT_DAILY_QUOTA, path=QUOTA_USAGE_FILE):
+        self.daily_units = daily_units
+        self.path = path
+        self._lock = threading.Lock()
+        self._day = None
+        self._used = 0
+        self._load()
+
+    def _today(self):
+        return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+    def _load(self):
+        self._day = self._today()
+        self._used = 0
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    usage = json.load(f)
+                if usage.get('day') == self._day:
+                    self._used = usage.get('used', 0)
+            except (OSError, ValueError):
+                pass
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({'day': self._day, 'used': self._used}, f)
+
+    def reserve(self, units):
+        """
+        Reserve quota units for a request
+
+        Returns:
+            bool: True if the units fit in today's remaining budget
+        """
+        with self._lock:
+            if self._day != self._today():
+                self._load()
+            if self._used + units > self.daily_units:
+                return False
+            self._used += units
+            self._save()
+            return True
+
+    def refund(self, units):
+        """Give back reserved units that were not spent"""
+        with self._lock:
+            self._used = max(0, self._used - units)
+            self._save()
+
+    def remaining(self):
+        """Return the quota units left for today"""
+        with self._lock:
+            return max(0, self.daily_units - self._used)
+
+class AnalysisBatcher:
+    """
+    Collects analysis requests from concurrent workers into multi-query Gemini requests
+
+    analyze() blocks until its query's batch has been analyzed. A batch is sent
+    as soon as it holds `batch_size` queries, or `max_wait` seconds after its
+    first query arrived if fewer come in.
+    """
+
+    def __init__(self, analyze_batch, batch_size=DEFAULT_LLM_BATCH_SIZE, max_wait=DEFAULT_LLM_BATCH_WAIT):
+        self.analyze_batch = analyze_batch
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._pending = []  # (query, videos, future)
+        self._timer = None
+
+    def analyze(self, query, videos):
+        """
+        Analyze one query's candidates as part of a batch
+
+        Returns:
+            dict: Best matching video with analysis
+        """
+        future = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((query, videos, future))
+            if len(self._pending) >= self.batch_size:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.max_wait, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._run(batch)
+        return future.result()
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._run(batch)
+
+    def _run(self, batch):
+        try:
+            results = self.analyze_batch([(query, videos) for query, videos, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+def read_queries(path):
+    """
+    Read queries from a file, one per line ('-' reads stdin)
+
+    Blank lines and lines starting with '#' are skipped.
+    """
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+def run_batch(queries, config, output=None, max_workers=DEFAULT_WORKERS, use_llm=True, options=None,
+              reload_config=False):
+    """
+    Search and analyze many queries concurrently
+
+    Each result is written to `output` as one JSON line as soon as its query completes.
+    Every YouTube and Gemini request (including search pages, retries and
+    tournament rounds) is paced by the configured rate limits, and each search
+    page reserves its quota cost from the daily budget as it is fetched.
+
+    Args:
+        queries (list): Search queries
+        config (dict): Loaded configuration
+        output: Writable text stream (defaults to stdout)
+        max_workers (int): Number of queries processed at once
+        use_llm (bool): Analyze with Gemini; if False, pick videos by local ranking only
+        options (dict): Search filters (max_results, min_duration, max_duration, days_ago, min_views);
+            search_youtube's defaults are used for any that are missing
+        reload_config (bool): Check config.json every CONFIG_RELOAD_INTERVAL seconds so API keys
+            added during a long batch are used
+
+    Returns:
+        int: Number of queries that produced a recommendation
+    """
+    output = output or sys.stdout
+    cache = cache_from_config(config)
+    video_store = store_from_config(config)
+    verdict_cache = verdict_cache_from_config(config)
+    quota_budget = config.get("search_quota_budget", DEFAULT_QUOTA_BUDGET)
+    youtube_limiter = RateLimiter(config.get("youtube_requests_per_second", DEFAULT_YOUTUBE_RATE))
+    gemini_limiter = RateLimiter(config.get("gemini_requests_per_second", DEFAULT_GEMINI_RATE))
+    # A key pool already tracks today's use of each key; a scheduler on top would count it
+    # twice, so with a pool there is only one when a daily quota is set explicitly
+    scheduler = None
+    if key_pool_from_config(config, "youtube") is None or "youtube_daily_quota" in config:
+        scheduler = QuotaScheduler(config.get("youtube_daily_quota", DEFAULT_DAILY_QUOTA))
+    top_k = config.get("llm_top_k", DEFAULT_TOP_K)
+    shard_size = config.get("llm_shard_size", DEFAULT_SHARD_SIZE)
+    token_budget = config.get("llm_prompt_token_budget", DEFAULT_PROMPT_TOKEN_BUDGET)
+    loaded = {'config': config, 'at': time.monotonic()}
+    reload_lock = threading.Lock()
+
+    def current_config():
+        """Return the configuration, re-read (refreshing the key pools) when reloading is due"""
+        with reload_lock:
+            if reload_config and time.monotonic() - loaded['at'] >= CONFIG_RELOAD_INTERVAL:
+                loaded['at'] = time.monotonic()
+                loaded['config'] = load_config() or loaded['config']
+            return loaded['config']
+
+    def analyze_batch(items):
+        current = current_config()
+        return analyze_query_batch(
+            items,
+            api_key=current["gemini_api_key"],
+            top_k=top_k,
+            verdict_cache=verdict_cache,
+            key_pool=key_pool_from_config(current, "gemini"),
+            token_budget=token_budget
+        )
+
+    # Never wait for more queries than there are workers to send them
+    batch_size = min(config.get("llm_batch_size", DEFAULT_LLM_BATCH_SIZE), max_workers)
+    batcher = None
+    if use_llm and batch_size > 1:
+        batcher = AnalysisBatcher(analyze_batch, batch_size, config.get("llm_batch_wait", DEFAULT_LLM_BATCH_WAIT))
+
+    def process(query):
+        start = time.perf_counter()
+        record = find_best(query)
+        record['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return record
+
+    def find_best(query):
+        current = current_config()
+        youtube_keys = key_pool_from_config(current, "youtube")
+        videos = search_youtube(
+            query=query,
+            api_key=current["youtube_api_key"],
+            cache=cache,
+            video_store=video_store,
+            quota_budget=quota_budget,
+            quota_scheduler=scheduler,
+            key_pool=youtube_keys,
+            dedupe_threshold=config.get("dedupe_threshold", DEFAULT_DEDUPE_THRESHOLD),
+            languages=config.get("search_languages", DEFAULT_LANGUAGES),
+            local_first=config.get("local_index_enabled", True),
+            **(options or {})
+        )
+        if not videos:
+            quota_sources = [source for source in (scheduler, youtube_keys) if source is not None]
+            if min(source.remaining() for source in quota_sources) < SEARCH_QUOTA_COST + VIDEOS_QUOTA_COST:
+                return {'query': query, 'error': "Daily YouTube quota exhausted"}
+            return {'query': query, 'videos': 0, 'best': None}
+
+        if not use_llm:
+            return {'query': query, 'videos': len(videos), 'best': best_local_video(videos, query)}
+
+        # Pools that need a tournament are analyzed on their own
+        if batcher is not None and min(len(videos), top_k or len(videos)) <= shard_size:
+            return {'query': query, 'videos': len(videos), 'best': batcher.analyze(query, videos)}
+
+        best_video = analyze_titles_tournament(
+            videos=videos,
+            query=query,
+            api_key=current["gemini_api_key"],
+            top_k=top_k,
+            shard_size=shard_size,
+            max_workers=config.get("llm_parallelism", DEFAULT_PARALLELISM),
+            token_budget=token_budget,
+            verdict_cache=verdict_cache,
+            key_pool=key_pool_from_config(current, "gemini")
+        )
+        return {'query': query, 'videos': len(videos), 'best': best_video}
+
+    # Pace each request rather than each query: a query can make many calls to either API
+    policies = {'youtube': get_policy('youtube'), 'gemini': get_policy('gemini')}
+    previous_limiters = {name: policy.limiter for name, policy in policies.items()}
+    policies['youtube'].limiter = youtube_limiter
+    policies['gemini'].limiter = gemini_limiter
+
+    succeeded = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(process, query): query for query in queries}
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {'query': futures[future], 'error': str(e)}
+                if record.get('best'):
+                    succeeded += 1
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+    finally:
+        for name, policy in policies.items():
+            policy.limiter = previous_limiters[name]
+
+    return succeeded
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for YouTube Video Finder
+Measures latency and throughput offline against fake YouTube and Gemini backends
+"""
+import io
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import datetime
+import platform
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import httplib2
+from googleapiclient.errors import HttpError
+from google.api_core.exceptions import ServiceUnavailable
+from youtube_search import search_youtube
+from llm_analysis import analyze_titles
+from batch import run_batch, QuotaScheduler
+from metrics import metrics
+import main as app
+
+DEFAULT_ITERATIONS = 30
+DEFAULT_CONCURRENCY = 8
+REGRESSION_THRESHOLD = 0.10  # 10% slower p95 or lower throughput counts as a regression
+OPTION_LINE = re.compile(r"^\d+\|", re.MULTILINE)  # one candidate line of an analysis prompt
+QUERY_LINE = re.compile(r"^Q\d+: .*$", re.MULTILINE)  # start of one query in a multi-query prompt
+
+class LatencyModel:
+    """
+    Random latency generator
+
+    Supported distributions: 'fixed' (always the median), 'uniform' (0 to twice
+    the median) and 'lognormal' (median with spread `sigma`, giving a long tail).
+    """
+
+    def __init__(self, median_ms, distribution='lognormal', sigma=0.5, rng=None):
+        self.median = median_ms / 1000
+        self.distribution = distribution
+        self.sigma = sigma
+        self.rng = rng or random.Random()
+
+    def sample(self):
+        """Return one latency in seconds"""
+        if self.median <= 0:
+            return 0.0
+        if self.distribution == 'fixed':
+            return self.median
+        if self.distribution == 'uniform':
+            return self.rng.uniform(0, 2 * self.median)
+        return self.rng.lognormvariate(0, self.sigma) * self.median
+
+    def wait(self):
+        """Sleep for one sampled latency"""
+        time.sleep(self.sample())
+
+def fake_http_error(status=503, message="Backend Error"):
+    """Build an HttpError like the ones raised by googleapiclient"""
+    content = json.dumps({'error': {'code': status, 'message': message}}).encode('utf-8')
+    return HttpError(httplib2.Response({'status': status}), content)
+
+class _FakeRequest:
+    def __init__(self, backend, handler, kwargs):
+        self._backend = backend
+        self._handler = handler
+        self._kwargs = kwargs
+
+    def execute(self, http=None):
+        self._backend.latency.wait()
+        if self._backend.rng.random() < self._backend.error_rate:
+            raise fake_http_error()
+        return self._handler(**self._kwargs)
+
+class _FakeCollection:
+    def __init__(self, backend, handler):
+        self._backend = backend
+        self._handler = handler
+
+    def list(self, **kwargs):
+        return _FakeRequest(self._backend, self._handler, kwargs)
+
+class FakeYouTube:
+    """
+    Stand-in for the YouTube Data API client returned by youtube_client.get_client
+
+    Each query has `total_results` videos; `pass_rate` of them are 4-20 minutes
+    long so the default duration filter keeps about that share.
+    """
+
+    def __init__(self, latency, error_rate=0.0, total_results=200, pass_rate=0.6, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.total_results = total_results
+        self.pass_rate = pass_rate
+        self.rng = random.Random(seed)
+
+    def _video(self, video_id):
+        digest = int(hashlib.md5(video_id.encode('utf-8')).hexdigest(), 16)
+        passes = (digest % 1000) / 1000 < self.pass_rate
+        minutes = 4 + digest % 16 if passes else (1 + digest % 3 if digest % 2 else 25 + digest % 60)
+        published = datetime.datetime(2024, 1, 1) + datetime.timedelta(hours=digest % (24 * 14))
+        return {
+            'id': video_id,
+            'snippet': {
+                'title': f"Video {video_id} about topic {digest % 97}",
+                'channelTitle': f"Channel {digest % 31}",
+                'publishedAt': published.isoformat() + "Z",
+                'thumbnails': {'high': {'url': f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"}}
+            },
+            'contentDetails': {'duration': f"PT{minutes}M{digest % 60}S"},
+            'statistics': {'viewCount': str(digest % 1000000)}
+        }
+
+    def _search(self, q, maxResults=5, pageToken=None, **kwargs):
+        start = int(pageToken or 0)
+        end = min(start + maxResults, self.total_results)
+        prefix = hashlib.md5(q.encode('utf-8')).hexdigest()[:6]
+        response = {'items': [{'id': {'videoId': f"{prefix}{i:05d}"}} for i in range(start, end)]}
+        if end < self.total_results:
+            response['nextPageToken'] = str(end)
+        return response
+
+    def _videos_list(self, id, part='', **kwargs):
+        items = []
+        for video_id in id.split(','):
+            item = self._video(video_id)
+            if part == 'statistics':
+                item = {'id': video_id, 'statistics': item['statistics']}
+            items.append(item)
+        return {'items': items}
+
+    def search(self):
+        return _FakeCollection(self, self._search)
+
+    def videos(self):
+        return _FakeCollection(self, self._videos_list)
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGemini:
+    """
+    Stand-in for google.generativeai.GenerativeModel
+
+    Picks a random option (per query in multi-query prompts) and supports stream=True by splitting
+    the reply into chunks that arrive over the sampled latency.
+    """
+
+    def __init__(self, latency, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+    def _reply(self, prompt):
+        reason = "It matches the query most closely and is clearly explained."
+        sections = QUERY_LINE.split(prompt)[1:]
+        if sections:
+            return json.dumps([
+                {"query": f"Q{number}", "best": self.rng.randint(1, max(1, len(OPTION_LINE.findall(section)))),
+                 "reason": reason}
+                for number, section in enumerate(sections, 1)
+            ])
+        options = max(1, len(OPTION_LINE.findall(prompt)))
+        return json.dumps({"best": self.rng.randint(1, options), "reason": reason})
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if self.rng.random() < self.error_rate:
+            self.latency.wait()
+            raise ServiceUnavailable("The model is overloaded")
+        text = self._reply(prompt)
+        if not stream:
+            self.latency.wait()
+            return _FakeResponse(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        chunks = [text[i:i + 16] for i in range(0, len(text), 16)]
+        delay = self.latency.sample() / len(chunks)
+        for chunk in chunks:
+            time.sleep(delay)
+            yield _FakeResponse(chunk)
+
+def percentile(values, pct):
+    """Return the pct-th percentile (0-100) of a list using linear interpolation"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize(name, latencies, errors, wall_time):
+    """Build the result record for one scenario"""
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        'scenario': name,
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'p50_ms': percentile(latencies_ms, 50),
+        'p95_ms': percentile(latencies_ms, 95),
+        'p99_ms': percentile(latencies_ms, 99),
+        'mean_ms': sum(latencies_ms) / len(latencies_ms) if latencies_ms else None,
+        'qps': (len(latencies) + errors) / wall_time if wall_time > 0 else None,
+        'wall_seconds': wall_time,
+        'counters': metrics.snapshot()['counters']
+    }
+
+def time_calls(func, arguments, concurrency=1):
+    """
+    Call func once per argument, `concurrency` calls at a time
+
+    Returns:
+        tuple: (latencies in seconds of successful calls, error count, wall time)
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(argument):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ok = func(argument)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok is False:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+
+    wall_start = time.perf_counter()
+    if concurrency <= 1:
+        for argument in arguments:
+            timed(argument)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, arguments))
+    return latencies, errors, time.perf_counter() - wall_start
+
+def benchmark_config():
+    """Configuration with on-disk caches disabled and rate limits lifted"""
+    return {
+        "youtube_api_key": "benchmark-youtube-key",
+        "gemini_api_key": "benchmark-gemini-key",
+        "search_cache_enabled": False,
+        "video_store_enabled": False,
+        "verdict_cache_enabled": False,
+        "youtube_requests_per_second": 1e6,
+        "gemini_requests_per_second": 1e6,
+        "youtube_daily_quota": 10 ** 12
+    }
+
+def run_benchmarks(args):
+    """
+    Run every scenario against the fake backends
+
+    Returns:
+        dict: Benchmark parameters and one summary per scenario
+    """
+    rng = random.Random(args.seed)
+    youtube = FakeYouTube(
+        LatencyModel(args.youtube_latency_ms, args.distribution, args.sigma, random.Random(rng.random())),
+        error_rate=args.error_rate, total_results=args.total_results, pass_rate=args.pass_rate, seed=args.seed
+    )
+    gemini = FakeGemini(
+        LatencyModel(args.gemini_latency_ms, args.distribution, args.sigma, random.Random(rng.random())),
+        error_rate=args.error_rate, seed=args.seed
+    )
+    config = benchmark_config()
+    queries = [f"benchmark query {i}" for i in range(args.iterations)]
+    candidates = []
+
+    def do_search(query):
+        return bool(search_youtube(query, config["youtube_api_key"], max_results=args.max_results))
+
+    def do_analyze(query):
+        return analyze_titles(candidates, query, config["gemini_api_key"]) is not None
+
+    def do_main(query):
+        with patch('main.get_user_input', return_value=query), \
+                contextlib.redirect_stdout(io.StringIO()):
+            return app.main([]) == 0
+
+    results = []
+    with patch('youtube_search.get_client', return_value=youtube), \
+            patch('google.generativeai.GenerativeModel', return_value=gemini), \
+            patch('google.generativeai.configure'), \
+            patch('main.load_config', return_value=config), \
+            patch('batch.QuotaScheduler', lambda units: QuotaScheduler(units, path=None)):
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            candidates = search_youtube("benchmark candidates", config["youtube_api_key"],
+                                        max_results=args.max_results)
+
+        scenarios = [
+            ('search_youtube', lambda: time_calls(do_search, queries)),
+            ('analyze_titles', lambda: time_calls(do_analyze, queries)),
+            ('search_youtube_concurrent', lambda: time_calls(do_search, queries, args.concurrency)),
+            ('pipeline_single', lambda: time_calls(do_main, queries[:args.main_iterations])),
+        ]
+        for name, scenario in scenarios:
+            metrics.reset()
+            with contextlib.redirect_stdout(io.StringIO()):
+                latencies, errors, wall_time = scenario()
+            results.append(summarize(name, latencies, errors, wall_time))
+
+        # Batch mode reports per-query records, so time it as a whole
+        metrics.reset()
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_batch(queries, config, output=output, max_workers=args.concurrency)
+        wall_time = time.perf_counter() - start
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        latencies = [record['elapsed_ms'] / 1000 for record in records if 'error' not in record]
+        results.append(summarize('pipeline_batch', latencies, len(records) - len(latencies), wall_time))
+
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'parameters': vars(args),
+        'results': results
+    }
+
+def compare(report, baseline):
+    """
+    Compare a report with an earlier one
+
+    Returns:
+        list: Messages for scenarios whose p95 latency or throughput regressed
+    """
+    previous = {result['scenario']: result for result in baseline.get('results', [])}
+    regressions = []
+    for result in report['results']:
+        old = previous.get(result['scenario'])
+        if not old:
+            continue
+        if old.get('p95_ms') and result['p95_ms'] and result['p95_ms'] > old['p95_ms'] * (1 + REGRESSION_THRESHOLD):
+            regressions.append(f"{result['scenario']}: p95 {old['p95_ms']:.1f} ms -> {result['p95_ms']:.1f} ms")
+        if old.get('qps') and result['qps'] and result['qps'] < old['qps'] * (1 - REGRESSION_THRESHOLD):
+            regressions.append(f"{result['scenario']}: throughput {old['qps']:.2f} -> {result['qps']:.2f} qps")
+    return regressions
+
+def print_report(report):
+    """Print a table of scenario results"""
+    print(f"{'scenario':<28}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'qps':>9}")
+    for result in report['results']:
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else "-"
+        print(f"{result['scenario']:<28}{result['requests']:>6}{result['errors']:>6}"
+              f"{fmt(result['p50_ms'], '10.1f')}{fmt(result['p95_ms'], '10.1f')}"
+              f"{fmt(result['p99_ms'], '10.1f')}{fmt(result['qps'], '9.2f')}")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark YouTube Video Finder against fake backends")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="Queries per scenario")
+    parser.add_argument("--main-iterations", type=int, default=3, help="Runs of the full interactive pipeline")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Workers for concurrent scenarios")
+    parser.add_argument("--max-results", type=int, default=20, help="max_results passed to search_youtube")
+    parser.add_argument("--youtube-latency-ms", type=float, default=80, help="Median YouTube API call latency")
+    parser.add_argument("--gemini-latency-ms", type=float, default=600, help="Median Gemini call latency")
+    parser.add_argument("--distribution", choices=('fixed', 'uniform', 'lognormal'), default='lognormal',
+                        help="Latency distribution of the fake backends")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Spread of the lognormal distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake API calls that fail")
+    parser.add_argument("--total-results", type=int, default=200, help="Search results available per query")
+    parser.add_argument("--pass-rate", type=float, default=0.6, help="Share of videos passing the duration filter")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--output", metavar="FILE", help="Save the report as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="Earlier JSON report to check for regressions")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the benchmarks, print a summary and optionally save or compare reports"""
+    args = parse_args(argv)
+    report = run_benchmarks(args)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f))
+        if regressions:
+            print("\nRegressions against baseline:")
+            for message in regressions:
+                print(f"  - {message}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,15 +5,34 @@ Handles loading API keys and other configuration data
 import os
 import json
 import sys
+import time
+import hashlib
+import datetime
+import threading
 
-CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
                          "config", "config.json")
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+KEY_USAGE_FILE = os.path.join(CACHE_DIR, "key_usage.json")
+
+SERVICES = ("youtube", "gemini")
+# Default daily budget per key: YouTube quota units, Gemini requests
+DEFAULT_KEY_QUOTAS = {"youtube": 10000, "gemini": 1500}
+RATE_LIMIT_COOLDOWN = 60  # seconds a rate-limited key is skipped
+
+_config_cache = None  # ((mtime, size), config) of the last file read
+_config_lock = threading.Lock()
+_usage_file_lock = threading.Lock()  # every service's pool shares the usage file
 
 def load_config():
     """
     Load configuration from config.json file
     Returns a dictionary with configuration values or None if configuration failed
+
+    The file is only parsed again when it changes on disk, so calling this for
+    every request picks up edits (e.g. new API keys) without a restart.
     """
+    global _config_cache
     try:
         if not os.path.exists(CONFIG_FILE):
             # Create default config if it doesn't exist
@@ -21,30 +40,217 @@ def load_config():
                 "youtube_api_key": "",
                 "gemini_api_key": ""
             }
-            
+
             os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-            
+
             with open(CONFIG_FILE, 'w') as f:
                 json.dump(default_config, f, indent=4)
-                
+
             print(f"Created default config file at {CONFIG_FILE}")
             print("Please fill in your API keys in the config file and run the program again.")
             return None
-            
+
+        try:
+            stat = os.stat(CONFIG_FILE)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamp = None
+        with _config_lock:
+            if stamp is not None and _config_cache is not None and _config_cache[0] == stamp:
+                return dict(_config_cache[1])
+
         with open(CONFIG_FILE, 'r') as f:
             config = json.load(f)
-            
-        # Verify required keys exist
-        required_keys = ["youtube_api_key", "gemini_api_key"]
-        missing_keys = [key for key in required_keys if not config.get(key)]
-        
+
+        # Verify required keys exist (a single key or a pool per service)
+        missing_keys = [f"{service}_api_key" for service in SERVICES if not config_keys(config, service)]
+
         if missing_keys:
             print(f"Missing required configuration keys: {', '.join(missing_keys)}")
             print(f"Please update your config file at {CONFIG_FILE}")
             return None
-            
-        return config
-        
+
+        # Code that uses a single key gets the first one of each pool
+        for service in SERVICES:
+            if not config.get(f"{service}_api_key"):
+                config[f"{service}_api_key"] = config_keys(config, service)[0][0]
+
+        if stamp is not None:
+            with _config_lock:
+                _config_cache = (stamp, config)
+        return dict(config)
+
     except Exception as e:
         print(f"Error loading configuration: {e}")
-        return None 
\ No newline at end of file
+        return None
+
+def config_keys(config, service):
+    """
+    List the API keys configured for a service
+
+    Keys come from '<service>_api_keys' (strings, or objects with 'key' and an
+    optional 'daily_quota') and from the single '<service>_api_key'.
+
+    Args:
+        config (dict): Configuration values
+        service (str): 'youtube' or 'gemini'
+
+    Returns:
+        list: (key, daily quota) pairs without duplicates
+    """
+    default_quota = DEFAULT_KEY_QUOTAS[service]
+    keys = {}
+    single_key = config.get(f"{service}_api_key")
+    if single_key:
+        keys[single_key] = default_quota
+    for entry in config.get(f"{service}_api_keys") or []:
+        if isinstance(entry, str) and entry:
+            keys[entry] = default_quota
+        elif isinstance(entry, dict) and entry.get("key"):
+            keys[entry["key"]] = entry.get("daily_quota", default_quota)
+    return list(keys.items())
+
+class KeyPool:
+    """
+    Thread-safe pool of API keys for one service with per-key daily budgets
+
+    acquire() hands out the key with the most quota left today. Keys reported
+    as exhausted are skipped until the next day (daily quota) or for a short
+    cooldown (rate limit). Usage is saved to `path`, identified by a hash of
+    each key, so several runs on the same day share the budgets.
+    """
+
+    def __init__(self, service, keys, path=KEY_USAGE_FILE):
+        self.service = service
+        self.path = path
+        self._quotas = dict(keys)
+        self._lock = threading.Lock()
+        self._day = None
+        self._used = {}
+        self._exhausted = set()
+        self._cooldown_until = {}
+        self._load()
+
+    @staticmethod
+    def _key_id(key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+    def _today(self):
+        return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+    def _load(self):
+        self._day = self._today()
+        self._used = {}
+        self._exhausted = set()
+        if self.path and os.path.exists(self.path):
+            try:
+                with _usage_file_lock, open(self.path, 'r') as f:
+                    usage = json.load(f).get(self.service, {})
+                if usage.get('day') == self._day:
+                    self._used = usage.get('used', {})
+                    self._exhausted = set(usage.get('exhausted', []))
+            except (OSError, ValueError, AttributeError):
+                pass
+
+    def _save(self):
+        if not self.path:
+            return
+        # Read, update and atomically replace the file so the other service's usage survives
+        with _usage_file_lock:
+            try:
+                usage = {}
+                if os.path.exists(self.path):
+                    with open(self.path, 'r') as f:
+                        usage = json.load(f)
+                usage[self.service] = {'day': self._day, 'used': self._used, 'exhausted': sorted(self._exhausted)}
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w') as f:
+                    json.dump(usage, f)
+                os.replace(temp_path, self.path)
+            except (OSError, ValueError):
+                pass  # Losing usage only makes the budgets less accurate
+
+    def _remaining(self, key):
+        key_id = self._key_id(key)
+        if key_id in self._exhausted:
+            return 0
+        return max(0, self._quotas[key] - self._used.get(key_id, 0))
+
+    def update_keys(self, keys):
+        """Replace the configured keys and budgets, keeping today's usage of keys that remain"""
+        with self._lock:
+            self._quotas = dict(keys)
+
+    def acquire(self, units=1):
+        """
+        Reserve quota on the key with the most quota left
+
+        Args:
+            units (int): Quota units the request will cost
+
+        Returns:
+            str: API key, or None if no key has enough quota left
+        """
+        with self._lock:
+            if self._day != self._today():
+                self._load()
+            now = time.monotonic()
+            available = [
+                key for key in self._quotas
+                if self._cooldown_until.get(key, 0) <= now and self._remaining(key) >= units
+            ]
+            if not available:
+                return None
+            key = max(available, key=self._remaining)
+            key_id = self._key_id(key)
+            self._used[key_id] = self._used.get(key_id, 0) + units
+            self._save()
+            return key
+
+    def report_exhausted(self, key, daily=True):
+        """
+        Take a key out of rotation
+
+        Args:
+            key (str): Key that was refused
+            daily (bool): True for an exhausted daily quota (skipped until tomorrow),
+                False for a rate limit (skipped for RATE_LIMIT_COOLDOWN seconds)
+        """
+        with self._lock:
+            if daily:
+                self._exhausted.add(self._key_id(key))
+                self._save()
+            else:
+                self._cooldown_until[key] = time.monotonic() + RATE_LIMIT_COOLDOWN
+
+    def remaining(self):
+        """Return the quota left today across all keys"""
+        with self._lock:
+            return sum(self._remaining(key) for key in self._quotas)
+
+    def __len__(self):
+        return len(self._quotas)
+
+_key_pools = {}
+_key_pools_lock = threading.Lock()
+
+def key_pool_from_config(config, service):
+    """
+    Return the shared key pool for a service, updated to the keys in config
+
+    Recognised keys: youtube_api_keys, gemini_api_keys (the single *_api_key joins the pool)
+
+    Returns:
+        KeyPool: Pool of the service's keys, or None if no '<service>_api_keys' list is configured
+    """
+    if not config.get(f"{service}_api_keys"):
+        return None
+    keys = config_keys(config, service)
+    with _key_pools_lock:
+        pool = _key_pools.get(service)
+        if pool is None:
+            pool = _key_pools[service] = KeyPool(service, keys)
+        else:
+            pool.update_keys(keys)
+        return pool
@@ -0,0 +1,146 @@
+"""
+Near-duplicate detection for YouTube Video Finder
+Groups reuploads and mirrored copies by title with MinHash and LSH buckets
+"""
+import zlib
+import datetime
+from ranking import tokenize
+
+DEFAULT_DEDUPE_THRESHOLD = 0.8  # title token Jaccard similarity at which videos count as duplicates
+NUM_PERMUTATIONS = 32
+BANDS = 8  # LSH bands of NUM_PERMUTATIONS // BANDS rows; pairs above ~0.6 similarity share a bucket
+SEED = 1234
+
+# Words that mark a copy rather than change what the video is
+NOISE_WORDS = frozenset((
+    'official', 'video', 'full', 'hd', '4k', '1080p', '720p', 'hq', 'reupload', 'reuploaded',
+    'mirror', 'copy', 'new', 'latest', 'live', 'the', 'a', 'an', 'and', 'of', 'in', 'by', 'with',
+))
+
+_hash_params = None
+
+def title_tokens(title):
+    """Normalize a title into its set of meaningful words"""
+    tokens = frozenset(token for token in tokenize(title) if token not in NOISE_WORDS)
+    return tokens or frozenset(tokenize(title))
+
+def jaccard(a, b):
+    """Jaccard similarity of two sets (1.0 for two empty sets)"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def minhash(tokens):
+    """
+    MinHash signature of a token set
+
+    Each token is hashed with CRC32 and mapped through NUM_PERMUTATIONS
+    multiply-shift hash functions; the signature keeps the minimum of each.
+
+    Returns:
+        tuple: NUM_PERMUTATIONS integers
+    """
+    import numpy as np  # Imported on first use to keep startup fast
+
+    global _hash_params
+    if _hash_params is None:
+        rng = np.random.default_rng(SEED)
+        multipliers = rng.integers(1, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+        offsets = rng.integers(0, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64)
+        _hash_params = (multipliers, offsets)
+    multipliers, offsets = _hash_params
+
+    if not tokens:
+        return (0,) * NUM_PERMUTATIONS
+    hashes = np.array([zlib.crc32(token.encode('utf-8')) for token in tokens], dtype=np.uint64)
+    # uint64 arithmetic wraps around, which is what multiply-shift hashing relies on
+    permuted = (np.outer(multipliers, hashes) + offsets[:, None]) >> np.uint64(32)
+    return tuple(int(value) for value in permuted.min(axis=1))
+
+def _published(video):
+    published = video.get('published')
+    if not published:
+        return float('inf')
+    return datetime.datetime.fromisoformat(published.replace('Z', '+00:00')).timestamp()
+
+def preferred(candidate, current):
+    """Return True if `candidate` should represent a duplicate group instead of `current`"""
+    candidate_views = int(candidate.get('views') or 0)
+    current_views = int(current.get('views') or 0)
+    if candidate_views != current_views:
+        return candidate_views > current_views
+    return _published(candidate) < _published(current)
+
+class DuplicateIndex:
+    """
+    Incremental near-duplicate index over video titles
+
+    Each added video's MinHash signature is split into BANDS buckets. A new
+    video is only compared (by exact token Jaccard) with videos sharing a
+    bucket, so lookups stay close to constant time as the index grows.
+    """
+
+    def __init__(self, threshold=DEFAULT_DEDUPE_THRESHOLD):
+        self.threshold = threshold
+        self._buckets = {}
+        self._tokens = {}
+        self._last = (None, None, None)  # title, tokens and bands of the last lookup
+
+    def _signature(self, title):
+        """Tokens and LSH bands of a title, reusing the last lookup (find is usually followed by add)"""
+        if self._last[0] != title:
+            tokens = title_tokens(title)
+            signature = minhash(tokens)
+            rows = NUM_PERMUTATIONS // BANDS
+            bands = [(band, signature[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+            self._last = (title, tokens, bands)
+        return self._last[1], self._last[2]
+
+    def find(self, video):
+        """
+        Find an indexed near-duplicate of a video
+
+        Returns:
+            The key the duplicate was added with, or None
+        """
+        tokens, bands = self._signature(video['title'])
+        checked = set()
+        for band in bands:
+            for key in self._buckets.get(band, ()):
+                if key not in checked:
+                    checked.add(key)
+                    if jaccard(tokens, self._tokens[key]) >= self.threshold:
+                        return key
+        return None
+
+    def add(self, key, video):
+        """Index a video under a key (e.g. its position in a result list)"""
+        tokens, bands = self._signature(video['title'])
+        self._tokens[key] = tokens
+        for band in bands:
+            self._buckets.setdefault(band, []).append(key)
+
+def collapse_duplicates(videos, threshold=DEFAULT_DEDUPE_THRESHOLD):
+    """
+    Keep one video per group of near-duplicate titles
+
+    The representative is the copy with the most views (the earlier upload on
+    a tie), placed where the group first appeared in the list.
+
+    Args:
+        videos (list): Video dictionaries
+        threshold (float): Title similarity at which videos count as duplicates
+
+    Returns:
+        list: Representatives in order of first appearance
+    """
+    index = DuplicateIndex(threshold)
+    representatives = []
+    for video in videos:
+        position = index.find(video)
+        if position is None:
+            index.add(len(representatives), video)
+            representatives.append(video)
+        elif preferred(video, representatives[position]):
+            representatives[position] = video
+    return representatives
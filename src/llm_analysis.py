@@ -2,88 +2,585 @@
 LLM Analysis using Google's Gemini API
 Analyzes YouTube video titles to find the most relevant one for the query
 """
-import google.generativeai as genai
+import re
+import math
+import json
+import dataclasses
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ranking import rank_videos, best_local_video
+from verdict_cache import make_verdict_key
+from metrics import metrics, estimate_tokens
+from resilience import get_policy, quota_error_kind, CircuitOpenError
 
-def analyze_titles(videos, query, api_key):
+DEFAULT_SHARD_SIZE = 10
+DEFAULT_PARALLELISM = 4
+DEFAULT_PROMPT_TOKEN_BUDGET = 1024  # estimated prompt tokens per Gemini call
+TITLE_MAX_CHARS = 90
+CHANNEL_MAX_CHARS = 30
+QUERY_MAX_CHARS = 200
+MAX_OUTPUT_TOKENS = 256
+
+PROMPT_HEADER = (
+    'Search query: "{query}"\n'
+    "Which ONE video below is most likely the highest quality, most informative and most relevant "
+    "to the query? Consider clarity, specificity, information density and relevance.\n"
+    "Videos (number|title|channel|minutes):\n"
+)
+PROMPT_FOOTER = 'Reply with JSON only: {"best": <number>, "reason": "<why, at most 2 sentences>"}'
+BATCH_PROMPT_HEADER = (
+    "For each search query below, which ONE of its videos is most likely the highest quality, "
+    "most informative and most relevant to that query? Consider clarity, specificity, "
+    "information density and relevance.\n"
+    "Videos are listed as number|title|channel|minutes.\n"
+)
+BATCH_PROMPT_FOOTER = (
+    'Reply with a JSON array only, one entry per query: '
+    '[{"query": "Q1", "best": <number>, "reason": "<why, at most 2 sentences>"}, ...]'
+)
+
+# Response schema for SDK versions that support structured output
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {"best": {"type": "integer"}, "reason": {"type": "string"}},
+    "required": ["best", "reason"],
+}
+BATCH_VERDICT_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"query": {"type": "string"}, **VERDICT_SCHEMA["properties"]},
+        "required": ["query", "best", "reason"],
+    },
+}
+
+_gemini_clients = {}
+_gemini_clients_lock = threading.Lock()
+
+# The "best" field of a JSON reply, once the number is complete
+BEST_FIELD = re.compile(r'"best"\s*:\s*(\d+)\s*[,}\s]')
+CODE_FENCE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+
+def truncate(text, max_chars):
+    """Collapse whitespace and shorten text to max_chars, cutting at a word boundary if possible"""
+    text = " ".join(str(text).split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - 1]
+    if " " in cut[max_chars // 2:]:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut + "…"
+
+def format_option(number, video):
+    """One compact prompt line for a candidate video"""
+    title = truncate(video['title'], TITLE_MAX_CHARS).replace("|", "/")
+    channel = truncate(video['channel'], CHANNEL_MAX_CHARS).replace("|", "/")
+    return f"{number}|{title}|{channel}|{round(float(video['duration']))}"
+
+def build_prompt(videos, query, token_budget=DEFAULT_PROMPT_TOKEN_BUDGET):
     """
-    Analyze video titles using Gemini LLM to find the most relevant
+    Build a compact analysis prompt that fits in a token budget
+    
+    Titles and channels are truncated. If the candidates still do not fit, they
+    are ranked locally and the lowest ranked ones are left out (at least one is kept).
     
     Args:
-        videos (list): List of video dictionaries from YouTube search
+        videos (list): Candidate videos
         query (str): The original search query
-        api_key (str): Gemini API key
+        token_budget (int): Estimated prompt tokens allowed (None for no limit)
         
     Returns:
-        dict: Best matching video with analysis
+        tuple: (prompt, videos in the prompt in option order)
     """
-    if not videos:
+    header = PROMPT_HEADER.format(query=truncate(query, QUERY_MAX_CHARS))
+    lines = [format_option(number, video) for number, video in enumerate(videos, 1)]
+    prompt = header + "\n".join(lines) + "\n" + PROMPT_FOOTER
+    if token_budget is None or estimate_tokens(prompt) <= token_budget:
+        return prompt, videos
+    
+    fitted = []
+    lines = []
+    for video in rank_videos(videos, query):
+        line = format_option(len(fitted) + 1, video)
+        if fitted and estimate_tokens(header + "\n".join(lines + [line]) + "\n" + PROMPT_FOOTER) > token_budget:
+            break
+        fitted.append(video)
+        lines.append(line)
+    metrics.count('llm_candidates_trimmed_total', value=len(videos) - len(fitted))
+    return header + "\n".join(lines) + "\n" + PROMPT_FOOTER, fitted
+
+def parse_verdict(text, options=None):
+    """
+    Strictly parse a JSON verdict
+    
+    Args:
+        text (str): Reply text, optionally wrapped in a Markdown code fence
+        options (int): Number of options offered (None to skip the range check)
+        
+    Returns:
+        tuple: (0-based index of the best video, reason), or None if the reply is invalid
+    """
+    try:
+        verdict = json.loads(CODE_FENCE.sub("", text))
+    except ValueError:
         return None
+    return check_verdict(verdict, options)
+
+def check_verdict(verdict, options=None):
+    """Validate one decoded verdict object; returns (0-based index, reason) or None"""
+    if not isinstance(verdict, dict):
+        return None
+    best = verdict.get("best")
+    reason = verdict.get("reason")
+    if not isinstance(best, int) or isinstance(best, bool) or not isinstance(reason, str):
+        return None
+    if best < 1 or (options is not None and best > options):
+        return None
+    return best - 1, reason.strip()
+
+def build_batch_prompt(items):
+    """
+    Build one prompt asking for the best video of several queries
+    
+    Args:
+        items (list): (query, videos) pairs, each already trimmed with build_prompt
         
-    # Configure the Gemini API
-    genai.configure(api_key=api_key)
+    Returns:
+        str: Prompt; queries are labelled Q1, Q2, ... in order
+    """
+    sections = []
+    for number, (query, videos) in enumerate(items, 1):
+        lines = [format_option(option, video) for option, video in enumerate(videos, 1)]
+        sections.append(f'Q{number}: "{truncate(query, QUERY_MAX_CHARS)}"\n' + "\n".join(lines))
+    return BATCH_PROMPT_HEADER + "\n".join(sections) + "\n" + BATCH_PROMPT_FOOTER
+
+def parse_batch_verdicts(text, option_counts):
+    """
+    Strictly parse the reply to a multi-query prompt
     
-    # Create a list of video titles for analysis
-    video_data = []
-    for idx, video in enumerate(videos):
-        video_data.append(f"{idx+1}. Title: '{video['title']}' | Channel: {video['channel']} | Duration: {video['duration']} min")
+    Args:
+        text (str): Reply text, optionally wrapped in a Markdown code fence
+        option_counts (list): Number of options offered for each query
+        
+    Returns:
+        dict: Query position => (0-based index of the best video, reason) for every valid answer
+    """
+    try:
+        entries = json.loads(CODE_FENCE.sub("", text))
+    except ValueError:
+        return {}
+    if not isinstance(entries, list):
+        return {}
+    verdicts = {}
+    for entry in entries:
+        label = entry.get("query") if isinstance(entry, dict) else None
+        if not isinstance(label, str) or not re.fullmatch(r"Q\d+", label.strip()):
+            continue
+        position = int(label.strip()[1:]) - 1
+        if not 0 <= position < len(option_counts) or position in verdicts:
+            continue
+        verdict = check_verdict(entry, option_counts[position])
+        if verdict is not None:
+            verdicts[position] = verdict
+    return verdicts
+
+def generation_config(genai, schema=VERDICT_SCHEMA, max_output_tokens=MAX_OUTPUT_TOKENS):
+    """Generation settings for the default model, with JSON output where the SDK supports it"""
+    fields = {field.name for field in dataclasses.fields(genai.types.GenerationConfig)}
+    config = {"max_output_tokens": max_output_tokens}
+    if "response_mime_type" in fields:
+        config["response_mime_type"] = "application/json"
+    if "response_schema" in fields:
+        config["response_schema"] = schema
+    return config
+
+def gemini_client(api_key):
+    """
+    Get the Gemini API client for an API key, creating it on first use
     
-    # Create the prompt for Gemini
-    prompt = f"""
-    Original Search Query: "{query}"
+    Args:
+        api_key (str): Gemini API key
+        
+    Returns:
+        GenerativeServiceClient: Client sending every request with this key
+    """
+    with _gemini_clients_lock:
+        client = _gemini_clients.get(api_key)
+        if client is None:
+            # Imported on first use to keep startup fast
+            from google.ai import generativelanguage as glm
+            client = glm.GenerativeServiceClient(client_options={'api_key': api_key})
+            _gemini_clients[api_key] = client
+        return client
+
+def call_gemini(generate, api_key, model=None, policy=None, key_pool=None, hedge=True, schema=VERDICT_SCHEMA,
+                max_output_tokens=MAX_OUTPUT_TOKENS):
+    """
+    Send a Gemini request under a call policy, rotating pooled keys that run out of quota
     
-    Analyze the following YouTube video titles and determine which ONE is most likely to be the highest quality, 
-    most informative, and most relevant to the search query. Consider factors like clarity, 
-    specificity, information density, and relevance.
+    Args:
+        generate (callable): generate(model) sending the request and returning its result
+        api_key (str): Gemini API key
+        model: Model object with generate_content (defaults to Gemini 1.5 Flash bound to the
+            request's key; a caller's model is used with whatever client it already has)
+        policy (CallPolicy): Deadline, retry and circuit breaker settings
+            (defaults to the shared 'gemini' policy)
+        key_pool (KeyPool): Optional pool of API keys used instead of api_key
+        hedge (bool): Allow a duplicate request when the first one is slow
+        schema (dict): Response schema of the default model
+        max_output_tokens (int): Output limit of the default model
+        
+    Returns:
+        The result of generate, or None if every pooled key is out of quota
+    """
+    # Imported on first use to keep startup fast
+    import google.generativeai as genai
     
-    VIDEO OPTIONS:
-    {chr(10).join(video_data)}
+    policy = policy or get_policy('gemini')
+    default_model = model is None
+    while True:
+        if key_pool is not None:
+            api_key = key_pool.acquire()
+            if api_key is None:
+                return None
+        if default_model:
+            # genai.configure is process-wide and a model only looks up its client on the first
+            # call, so concurrent requests bind their own key's client to their own model
+            model = genai.GenerativeModel('gemini-1.5-flash', generation_config=generation_config(genai, schema, max_output_tokens))
+            model._client = gemini_client(api_key)
+        
+        try:
+            with metrics.span('gemini.generate'):
+                return policy.call(lambda model=model: generate(model), hedge=hedge)
+        except Exception as e:
+            kind = quota_error_kind(e)
+            if key_pool is None or kind is None:
+                raise
+            key_pool.report_exhausted(api_key, daily=kind == 'daily')
+            metrics.count('api_key_rotations_total', service='gemini', reason=kind)
+
+class VerdictParser:
+    """
+    Incremental parser for verdict replies
     
-    Select the BEST video option by providing:
-    1. The number of the best video (e.g., "3")
-    2. A brief explanation of why it's the best choice (2-3 sentences maximum)
+    Replies are expected as a JSON object {"best": <number>, "reason": "..."}; the
+    older BEST_VIDEO / REASON line format is still understood. Text can be fed in
+    arbitrary chunks. best_index is set as soon as the number is complete, and
+    close() validates the whole reply (format is then 'json', 'legacy' or 'invalid').
+    """
     
-    Format your response exactly like this:
-    BEST_VIDEO: [Number]
-    REASON: [Your explanation]
+    def __init__(self, options=None):
+        self.options = options
+        self.best_index = None
+        self.reason = ""
+        self.text = ""
+        self.format = None
+        self._buffer = ""
+    
+    def feed(self, text):
+        """Add a chunk of response text and parse what is complete"""
+        self.text += text
+        self._buffer += text
+        if self.format is None and self.text.strip():
+            self.format = 'json' if self.text.lstrip().startswith(("{", "`")) else 'legacy'
+        if self.format == 'json':
+            if self.best_index is None:
+                match = BEST_FIELD.search(self.text)
+                if match:
+                    self.best_index = int(match.group(1)) - 1
+        elif self.format == 'legacy':
+            *lines, self._buffer = self._buffer.split('\n')
+            for line in lines:
+                self._parse_line(line)
+    
+    def close(self):
+        """Parse whatever is left and validate the reply"""
+        if self.format == 'json':
+            verdict = parse_verdict(self.text, self.options)
+            if verdict is None:
+                self.format = 'invalid'
+                self.best_index = None
+            else:
+                self.best_index, self.reason = verdict
+        elif self._buffer:
+            self._parse_line(self._buffer)
+            self._buffer = ""
+        if self.format == 'legacy' and self.best_index is None:
+            self.format = 'invalid'
+    
+    def _parse_line(self, line):
+        line = line.strip()
+        if line.startswith("BEST_VIDEO:"):
+            try:
+                self.best_index = int(line.split("BEST_VIDEO:")[1].strip()) - 1
+            except ValueError:
+                # Try to extract just the number if the format is different
+                numbers = re.findall(r'\d+', line)
+                if numbers:
+                    self.best_index = int(numbers[0]) - 1
+        elif line.startswith("REASON:"):
+            self.reason = line.split("REASON:")[1].strip()
+
+@metrics.timed('analyze_titles')
+def analyze_titles(videos, query, api_key, top_k=None, verdict_cache=None, model=None, stream=False,
+                   on_best=None, policy=None, key_pool=None, token_budget=DEFAULT_PROMPT_TOKEN_BUDGET):
     """
+    Analyze video titles using Gemini LLM to find the most relevant
+    
+    Args:
+        videos (list): List of video dictionaries from YouTube search
+        query (str): The original search query
+        api_key (str): Gemini API key
+        top_k (int): Only send this many best locally ranked videos to Gemini (None for all)
+        verdict_cache (VerdictCache): Optional cache; a stored verdict skips the Gemini call
+        model: Model object with generate_content (defaults to Gemini 1.5 Flash)
+        stream (bool): Stream the response and parse it as it arrives
+        on_best (callable): With stream, called with the chosen video (empty analysis)
+            as soon as the chosen number is parsed, before the reason arrives; that pick is
+            then final, and the request is not retried if the rest of the reply fails
+        policy (CallPolicy): Deadline, retry and circuit breaker settings
+            (defaults to the shared 'gemini' policy)
+        key_pool (KeyPool): Optional pool of API keys used instead of api_key; a key that
+            runs out of quota is rotated out and the request is sent again with the next one
+        token_budget (int): Estimated prompt tokens allowed; titles are truncated and the lowest
+            locally ranked candidates left out to fit (None for no limit)
+        
+    Returns:
+        dict: Best matching video with analysis (chosen by local ranking if Gemini is unavailable)
+    """
+    if not videos:
+        return None
     
+    # Shortlist candidates locally so the prompt stays small
+    if top_k is not None and len(videos) > top_k:
+        videos = rank_videos(videos, query, top_k=top_k)
+    
+    # Reuse an earlier verdict for the same query and candidates
+    verdict_key = None
+    if verdict_cache is not None:
+        verdict_key = make_verdict_key(query, videos)
+        verdict = verdict_cache.get(verdict_key)
+        if verdict is not None:
+            video_id, reason = verdict
+            for video in videos:
+                if video['id'] == video_id:
+                    return {**video, 'analysis': reason}
+
+    
+    # Compact option lines, trimmed to the token budget
+    prompt, videos = build_prompt(videos, query, token_budget)
+    
+    announced = None  # index of the video passed to on_best
+    cut_off = "Gemini's explanation was cut off."
     try:
-        # Generate content with Gemini
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
+        def generate(model):
+            nonlocal announced
+            parser = VerdictParser(len(videos))
+            if stream:
+                # Resolve the best video as soon as its line is complete, while the reason streams in
+                try:
+                    for chunk in model.generate_content(prompt, stream=True):
+                        parser.feed(chunk.text)
+                        best_index = parser.best_index
+                        if on_best is not None and announced is None and best_index is not None \
+                                and 0 <= best_index < len(videos):
+                            on_best({**videos[best_index], 'analysis': ""})
+                            announced = best_index
+                except Exception:
+                    # A retry could pick another video than the one already announced
+                    if announced is None:
+                        raise
+                usage = None
+            else:
+                response = model.generate_content(prompt)
+                parser.feed(response.text)
+                usage = getattr(response, 'usage_metadata', None)
+            parser.close()
+            return parser, usage
+        
+        # A streamed reply has already reached on_best, so it is retried but never hedged
+        result = call_gemini(generate, api_key, model, policy, key_pool, hedge=not stream)
+        if result is None:
+            return best_local_video(
+                videos, query, "Every Gemini API key is out of quota. Returning best locally ranked result."
+            )
+        parser, usage = result
+        
+        # Use reported token counts when the SDK provides them, otherwise estimate
+        prompt_tokens = getattr(usage, 'prompt_token_count', None)
+        response_tokens = getattr(usage, 'candidates_token_count', None)
+        metrics.count_tokens(
+            prompt_tokens if isinstance(prompt_tokens, int) else estimate_tokens(prompt),
+            response_tokens if isinstance(response_tokens, int) else estimate_tokens(parser.text)
+        )
+        
+        metrics.count('llm_replies_total', format=parser.format or 'invalid')
         
         # Parse the response to get the best video index
-        response_text = response.text
+        best_video_idx = parser.best_index
+        reason = parser.reason
         
-        best_video_idx = None
-        reason = ""
+        # The announced pick stands even if the rest of the reply was lost or is invalid
+        if announced is not None and best_video_idx != announced:
+            return {**videos[announced], 'analysis': cut_off}
         
-        # Extract the best video number
-        for line in response_text.split('\n'):
-            if line.startswith("BEST_VIDEO:"):
-                try:
-                    best_video_idx = int(line.split("BEST_VIDEO:")[1].strip()) - 1
-                except:
-                    # Try to extract just the number if the format is different
-                    import re
-                    numbers = re.findall(r'\d+', line)
-                    if numbers:
-                        best_video_idx = int(numbers[0]) - 1
-            elif line.startswith("REASON:"):
-                reason = line.split("REASON:")[1].strip()
-        
-        # If no index was found or it's invalid, default to the first video
+        # If no index was found or it's invalid, fall back to local ranking
         if best_video_idx is None or best_video_idx < 0 or best_video_idx >= len(videos):
-            best_video_idx = 0
-            reason = "Unable to determine best video from analysis. Showing first result."
+            return best_local_video(
+                videos, query,
+                "Unable to determine best video from analysis. Showing best locally ranked result."
+            )
         
         # Get the best video and add the analysis
         best_video = videos[best_video_idx].copy()
         best_video['analysis'] = reason
         
+        if verdict_cache is not None:
+            verdict_cache.set(verdict_key, best_video['id'], reason)
+        
         return best_video
         
+    except CircuitOpenError:
+        # Don't wait on a backend that has been failing; answer locally right away
+        return best_local_video(videos, query, "Gemini is unavailable. Returning best locally ranked result.")
     except Exception as e:
+        if announced is not None:
+            return {**videos[announced], 'analysis': cut_off}
         print(f"Error analyzing titles with Gemini: {e}")
-        # Fall back to the first video
-        return {**videos[0], 'analysis': "Error analyzing titles. Returning first result."} 
\ No newline at end of file
+        # Fall back to local ranking
+        return best_local_video(videos, query, "Error analyzing titles. Returning best locally ranked result.")
+
+def analyze_titles_tournament(videos, query, api_key, top_k=None, shard_size=DEFAULT_SHARD_SIZE,
+                              max_workers=DEFAULT_PARALLELISM, verdict_cache=None, model=None, key_pool=None,
+                              token_budget=DEFAULT_PROMPT_TOKEN_BUDGET, **kwargs):
+    """
+    Analyze a large candidate pool as a tournament of smaller prompts
+    
+    Candidates are split into the fewest shards of at most `shard_size`, as
+    equal in size as possible, each shard is analyzed in parallel, and the shard
+    winners go on to the next round until one prompt can hold them all. Small
+    pools are analyzed with a single call, and a shard of one video wins without one.
+    
+    Args:
+        videos (list): List of video dictionaries from YouTube search
+        query (str): The original search query
+        api_key (str): Gemini API key
+        top_k (int): Only keep this many best locally ranked videos (None for all)
+        shard_size (int): Maximum number of videos per prompt
+        max_workers (int): Number of shard prompts sent at once
+        verdict_cache (VerdictCache): Optional cache used for every round
+        model: Model object with generate_content (defaults to Gemini 1.5 Flash)
+        key_pool (KeyPool): Optional pool of API keys used for every round
+        token_budget (int): Estimated prompt tokens allowed per call
+        **kwargs: Passed to analyze_titles for the final round (e.g. stream, on_best)
+        
+    Returns:
+        dict: Best matching video with analysis
+    """
+    if not videos:
+        return None
+    
+    if top_k is not None and len(videos) > top_k:
+        videos = rank_videos(videos, query, top_k=top_k)
+    
+    shard_size = max(2, shard_size)  # Each round must shrink the pool
+    
+    def analyze_shard(shard):
+        if len(shard) == 1:
+            return shard[0]
+        return analyze_titles(shard, query, api_key, verdict_cache=verdict_cache, model=model, key_pool=key_pool,
+                              token_budget=token_budget)
+    
+    while len(videos) > shard_size:
+        count = math.ceil(len(videos) / shard_size)
+        size, extra = divmod(len(videos), count)  # the first `extra` shards hold one more video
+        bounds = [i * size + min(i, extra) for i in range(count + 1)]
+        shards = [videos[start:end] for start, end in zip(bounds, bounds[1:])]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            winners = list(executor.map(analyze_shard, shards))
+        videos = [{key: value for key, value in winner.items() if key != 'analysis'} for winner in winners]
+    
+    return analyze_titles(videos, query, api_key, verdict_cache=verdict_cache, model=model, key_pool=key_pool,
+                          token_budget=token_budget, **kwargs)
+
+@metrics.timed('analyze_query_batch')
+def analyze_query_batch(items, api_key, top_k=None, verdict_cache=None, model=None, policy=None, key_pool=None,
+                        token_budget=DEFAULT_PROMPT_TOKEN_BUDGET):
+    """
+    Analyze the candidates of several independent queries with one Gemini request
+    
+    Each query's candidates are shortlisted and trimmed as in analyze_titles, then
+    all of them are sent in one prompt asking for a JSON answer per query. Queries
+    whose answer is missing or invalid (or all of them, if the request fails) are
+    analyzed again on their own with analyze_titles.
+    
+    Args:
+        items (list): (query, videos) pairs
+        api_key (str): Gemini API key
+        top_k (int): Only send this many best locally ranked videos per query (None for all)
+        verdict_cache (VerdictCache): Optional cache; queries with a stored verdict are not sent
+        model: Model object with generate_content (defaults to Gemini 1.5 Flash)
+        policy (CallPolicy): Deadline, retry and circuit breaker settings
+        key_pool (KeyPool): Optional pool of API keys used instead of api_key
+        token_budget (int): Estimated prompt tokens allowed per query
+        
+    Returns:
+        list: Best matching video with analysis for each item, in order (None for items without videos)
+    """
+    results = [None] * len(items)
+    pending = []  # (item position, query, shortlist, candidates in option order, verdict key)
+    for position, (query, videos) in enumerate(items):
+        if not videos:
+            continue
+        if top_k is not None and len(videos) > top_k:
+            videos = rank_videos(videos, query, top_k=top_k)
+        verdict_key = None
+        if verdict_cache is not None:
+            verdict_key = make_verdict_key(query, videos)
+            verdict = verdict_cache.get(verdict_key)
+            if verdict is not None:
+                cached = [video for video in videos if video['id'] == verdict[0]]
+                if cached:
+                    results[position] = {**cached[0], 'analysis': verdict[1]}
+                    continue
+        _, options = build_prompt(videos, query, token_budget)
+        pending.append((position, query, videos, options, verdict_key))
+    
+    verdicts = {}
+    if len(pending) > 1:
+        prompt = build_batch_prompt([(query, options) for _, query, _, options, _ in pending])
+        
+        def generate(model):
+            return model.generate_content(prompt)
+        
+        try:
+            response = call_gemini(generate, api_key, model, policy, key_pool, schema=BATCH_VERDICT_SCHEMA,
+                                   max_output_tokens=MAX_OUTPUT_TOKENS * len(pending))
+        except CircuitOpenError:
+            response = None  # Each query falls back to local ranking below without waiting
+        except Exception as e:
+            print(f"Error analyzing queries with Gemini: {e}")
+            response = None
+        if response is not None:
+            verdicts = parse_batch_verdicts(response.text, [len(options) for _, _, _, options, _ in pending])
+            usage = getattr(response, 'usage_metadata', None)
+            prompt_tokens = getattr(usage, 'prompt_token_count', None)
+            response_tokens = getattr(usage, 'candidates_token_count', None)
+            metrics.count_tokens(
+                prompt_tokens if isinstance(prompt_tokens, int) else estimate_tokens(prompt),
+                response_tokens if isinstance(response_tokens, int) else estimate_tokens(response.text)
+            )
+        metrics.count('llm_batch_queries_total', value=len(verdicts), result='answered')
+        metrics.count('llm_batch_queries_total', value=len(pending) - len(verdicts), result='retried')
+    
+    for number, (position, query, videos, options, verdict_key) in enumerate(pending):
+        if number not in verdicts:
+            # The untrimmed shortlist, so the verdict lands under the key looked up above
+            results[position] = analyze_titles(videos, query, api_key, verdict_cache=verdict_cache, model=model,
+                                               policy=policy, key_pool=key_pool, token_budget=token_budget)
+            continue
+        best_index, reason = verdicts[number]
+        results[position] = {**options[best_index], 'analysis': reason}
+        if verdict_cache is not None:
+            verdict_cache.set(verdict_key, options[best_index]['id'], reason)
+    return results
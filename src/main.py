@@ -5,11 +5,22 @@ Main application that orchestrates searching, filtering and analyzing YouTube vi
 """
 import os
 import sys
-import time
-from youtube_search import search_youtube
-from text_input import get_user_input, print_colored
-from llm_analysis import analyze_titles
-from config_manager import load_config
+import json
+import argparse
+import contextlib
+from youtube_search import search_youtube, DEFAULT_QUOTA_BUDGET, DEFAULT_DEDUPE_THRESHOLD, DEFAULT_LANGUAGES
+from text_input import get_user_input, print_colored, set_animations, transcribe_files
+from llm_analysis import analyze_titles_tournament, DEFAULT_SHARD_SIZE, DEFAULT_PARALLELISM, DEFAULT_PROMPT_TOKEN_BUDGET
+from ranking import best_local_video, DEFAULT_TOP_K
+from config_manager import load_config, key_pool_from_config
+from search_cache import cache_from_config
+from video_store import store_from_config
+from verdict_cache import verdict_cache_from_config
+from batch import run_batch, read_queries, DEFAULT_WORKERS
+from pipeline import BackgroundAnalysis
+from watch import run_watch, DEFAULT_INTERVAL
+from metrics import metrics
+from resilience import configure_policies
 from datetime import datetime
 
 def format_duration(minutes):
@@ -27,14 +38,7 @@ def format_date(date_str):
     date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
     return date_obj.strftime("%b %d, %Y")
 
-def print_progress(message, steps=3, delay=0.3):
-    """Print progress animation"""
-    print(message, end="")
-    for _ in range(steps):
-        time.sleep(delay)
-        print(".", end="", flush=True)
-    print()
-
+@metrics.timed('display_video_results')
 def display_video_results(videos, query):
     """Display a summary of found videos"""
     print_colored("\n🎬 Videos found matching your criteria:", "cyan", "bold")
@@ -55,6 +59,12 @@ def display_video_results(videos, query):
         if len(videos) > 5:
             print_colored(f"  ... and {len(videos) - 5} more", "white")
 
+def display_early_pick(video):
+    """Display the chosen video while the explanation is still being generated"""
+    print_colored(f"\n⚡ Top pick: {video['title']} ({video['channel']})", "yellow", "bold")
+    print_colored("   Waiting for the explanation...", "white")
+
+@metrics.timed('display_best_video')
 def display_best_video(video):
     """Display the best video recommendation with enhanced formatting"""
     print_colored("\n┏━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┓", "green")
@@ -73,51 +83,242 @@ def display_best_video(video):
     
     print_colored("\n✨ Enjoy your video! ✨\n", "green", "bold")
 
-def main():
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Find the best recent YouTube video for a query")
+    parser.add_argument("--query", "-q", help="Search query (skips the interactive prompts)")
+    parser.add_argument("--max-results", type=int, default=20, help="Maximum number of videos (default: 20)")
+    parser.add_argument("--min-duration", type=int, default=4 * 60,
+                        help="Minimum video duration in seconds (default: 240)")
+    parser.add_argument("--max-duration", type=int, default=20 * 60,
+                        help="Maximum video duration in seconds (default: 1200)")
+    parser.add_argument("--days-ago", type=int, default=14,
+                        help="Only include videos published in the last N days (default: 14)")
+    parser.add_argument("--min-views", type=int, default=0, help="Only include videos with at least N views")
+    parser.add_argument("--output-format", choices=("text", "ndjson"), default="text",
+                        help="'ndjson' streams each candidate and the recommendation as JSON lines")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Run every query in FILE (one per line, '-' for stdin) and print JSON lines")
+    parser.add_argument("--watch", type=float, nargs="?", const=DEFAULT_INTERVAL, metavar="SECONDS",
+                        help="Re-run the query (or the --batch queries) every SECONDS, fetching only new videos "
+                             f"and printing JSON lines (default interval: {DEFAULT_INTERVAL})")
+    parser.add_argument("--audio", nargs="+", metavar="FILE",
+                        help="Transcribe WAV/AIFF/FLAC files (or directories of them) into queries; "
+                             "several files are run like --batch")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Number of queries processed at once in batch mode (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--no-llm", action="store_true",
+                        help="Pick the best video with local ranking only, without calling Gemini")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as an HTTP service with /search and /recommend endpoints")
+    parser.add_argument("--host", help="Service host (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="Service port (default: 8080)")
+    parser.add_argument("--fast", action="store_true",
+                        help="Skip cosmetic progress animations (automatic when output is not a terminal)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report import and initialization cost per module, then exit")
+    parser.add_argument("--trace", metavar="FILE", help="Append a JSON line per timed stage to FILE")
+    parser.add_argument("--metrics-out", metavar="FILE",
+                        help="Write Prometheus-style metrics (latency histograms, quota, tokens) to FILE on exit")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to run the YouTube Video Finder application"""
+    args = parse_args(argv)
+    metrics.trace_path = args.trace
+    if args.fast:
+        set_animations(False)
+    if args.profile_startup:
+        from startup import print_startup_profile
+        print_startup_profile()
+        return 0
+    try:
+        return run(args)
+    finally:
+        if args.metrics_out:
+            with open(args.metrics_out, 'w', encoding='utf-8') as f:
+                f.write(metrics.to_prometheus())
+
+def run(args):
+    """Run the mode selected on the command line"""
     # Load configuration
-    config = load_config()
+    with metrics.span('load_config'):
+        config = load_config()
     if not config:
         print_colored("❌ Failed to load configuration. Exiting.", "red", "bold")
         return 1
+    configure_policies(config)
+    
+    # Service mode keeps clients and caches warm between requests
+    if args.serve:
+        import asyncio
+        from service import serve, DEFAULT_HOST, DEFAULT_PORT
+        asyncio.run(serve(config, args.host or DEFAULT_HOST, args.port or DEFAULT_PORT))
+        return 0
+    
+    # Watch mode re-runs queries incrementally until interrupted
+    if args.watch is not None:
+        queries = read_queries(args.batch) if args.batch else [args.query or get_user_input()]
+        run_watch([query for query in queries if query], config, search_options(args), interval=args.watch,
+                  use_llm=not args.no_llm, reload_config=True)
+        return 0
+    
+    # Batch mode skips the interactive prompts
+    if args.batch:
+        run_batch(read_queries(args.batch), config, max_workers=args.workers, use_llm=not args.no_llm,
+                  options=search_options(args), reload_config=True)
+        return 0
     
-    # Get user input (text/voice)
-    query = get_user_input()
+    # Pre-recorded voice queries: one file is a single query, several are a batch
+    audio_query = None
+    if args.audio:
+        with contextlib.redirect_stdout(sys.stderr):
+            transcribed = transcribe_files(args.audio, max_workers=args.workers)
+        queries = [query for _, query in transcribed if query]
+        if len(transcribed) > 1:
+            run_batch(queries, config, max_workers=args.workers, use_llm=not args.no_llm,
+                      options=search_options(args), reload_config=True)
+            return 0
+        audio_query = queries[0] if queries else None
+        if audio_query is None:
+            print_colored("❌ Could not transcribe the audio file. Exiting.", "red", "bold")
+            return 1
+    
+    # Use the query from the command line, or ask for one (text/voice)
+    query = args.query or audio_query or get_user_input()
     if not query:
         print_colored("❌ No input provided. Exiting.", "red", "bold")
         return 1
     
+    # Shared by every analysis of this run, so verdicts stay in its in-memory tier
+    verdict_cache = verdict_cache_from_config(config)
+    
+    if args.output_format == "ndjson":
+        return run_ndjson(query, config, args, verdict_cache)
+    
+    # Analysis runs in the background: speculatively on early pages while later
+    # ones are fetched, then on the final candidates while the preview renders
+    analysis = None
+    if not args.no_llm:
+        analysis = BackgroundAnalysis(
+            lambda candidates, **kwargs: pick_best_video(candidates, query, config, args, verdict_cache, **kwargs),
+            query, top_k=config.get("llm_top_k", DEFAULT_TOP_K)
+        )
+    
     # Search YouTube with filters
-    print_progress("🔍 Searching YouTube", steps=5, delay=0.3)
-    videos = search_youtube(
-        query=query,
-        api_key=config["youtube_api_key"],
-        max_results=20,
-        min_duration=4 * 60,  # 4 minutes in seconds
-        max_duration=20 * 60,  # 20 minutes in seconds
-        days_ago=14
-    )
+    print_colored("🔍 Searching YouTube...", "white")
+    videos = find_videos(query, config, args, on_page=analysis.speculate if analysis else None)
     
     if not videos:
         print_colored("\n❌ No videos found matching your criteria.", "red", "bold")
         return 0
     
+    if analysis is not None:
+        analysis.start(videos)
+    
     # Display found videos
     display_video_results(videos, query)
     
-    # Analyze titles with Gemini
-    print_colored("\n🧠 Analyzing video titles with AI...", "magenta")
-    print_progress("   Processing", steps=5, delay=0.4)
+    if analysis is not None:
+        print_colored("\n🧠 Analyzing video titles with AI...", "magenta")
+        best_video = wait_for_analysis(analysis)
+    else:
+        best_video = pick_best_video(videos, query, config, args, verdict_cache)
+    
+    # Display results
+    display_best_video(best_video)
     
-    best_video = analyze_titles(
+    return 0
+
+def wait_for_analysis(analysis, interval=0.4):
+    """Show progress until the background analysis finishes, and the early pick once it is known"""
+    print("   Processing", end="", flush=True)
+    shown_pick = False
+    while not analysis.wait(interval):
+        if analysis.early_pick is not None and not shown_pick:
+            print()
+            display_early_pick(analysis.early_pick)
+            shown_pick = True
+        else:
+            print(".", end="", flush=True)
+    print()
+    return analysis.result()
+
+def search_options(args):
+    """Search filters given on the command line"""
+    return {
+        'max_results': args.max_results,
+        'min_duration': args.min_duration,
+        'max_duration': args.max_duration,
+        'days_ago': args.days_ago,
+        'min_views': args.min_views
+    }
+
+def find_videos(query, config, args, on_video=None, on_page=None, on_replace=None):
+    """Search YouTube with the filters given on the command line"""
+    return search_youtube(
+        query=query,
+        api_key=config["youtube_api_key"],
+        **search_options(args),
+        cache=cache_from_config(config),
+        video_store=store_from_config(config),
+        quota_budget=config.get("search_quota_budget", DEFAULT_QUOTA_BUDGET),
+        on_video=on_video,
+        on_page=on_page,
+        on_replace=on_replace,
+        dedupe_threshold=config.get("dedupe_threshold", DEFAULT_DEDUPE_THRESHOLD),
+        languages=config.get("search_languages", DEFAULT_LANGUAGES),
+        local_first=config.get("local_index_enabled", True),
+        key_pool=key_pool_from_config(config, "youtube")
+    )
+
+def pick_best_video(videos, query, config, args, verdict_cache=None, on_best=None):
+    """Pick the best video with Gemini, or with local ranking only when --no-llm is set"""
+    if args.no_llm:
+        return best_local_video(videos, query)
+    
+    return analyze_titles_tournament(
         videos=videos,
         query=query,
-        api_key=config["gemini_api_key"]
+        api_key=config["gemini_api_key"],
+        top_k=config.get("llm_top_k", DEFAULT_TOP_K),
+        shard_size=config.get("llm_shard_size", DEFAULT_SHARD_SIZE),
+        max_workers=config.get("llm_parallelism", DEFAULT_PARALLELISM),
+        token_budget=config.get("llm_prompt_token_budget", DEFAULT_PROMPT_TOKEN_BUDGET),
+        verdict_cache=verdict_cache,
+        key_pool=key_pool_from_config(config, "gemini"),
+        stream=True,
+        on_best=on_best
     )
+
+def run_ndjson(query, config, args, verdict_cache=None):
+    """
+    Stream results as NDJSON on stdout
     
-    # Display results
-    display_best_video(best_video)
+    Emits a 'video' record for each candidate as soon as it passes the filters,
+    a 'replace' record when a near-duplicate found later takes the place of one,
+    a 'pick' record as soon as the best video is known, and a final
+    'recommendation' record that includes the analysis.
+    """
+    output = sys.stdout
+    
+    def emit(record_type, **fields):
+        output.write(json.dumps({'type': record_type, 'query': query, **fields}, ensure_ascii=False) + "\n")
+        output.flush()
     
+    # Keep diagnostic prints from the search and analysis off the NDJSON stream
+    with contextlib.redirect_stdout(sys.stderr):
+        videos = find_videos(
+            query, config, args,
+            on_video=lambda video: emit('video', video=dict(video)),
+            on_replace=lambda old, new: emit('replace', replaces=old['id'], video=dict(new))
+        )
+        if not videos:
+            emit('recommendation', video=None)
+            return 0
+        best_video = pick_best_video(videos, query, config, args, verdict_cache,
+                                     on_best=lambda video: emit('pick', video=video))
+        emit('recommendation', video=best_video)
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+"""
+Instrumentation for YouTube Video Finder
+Per-stage timing spans, latency histograms and API usage counters
+"""
+import json
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# YouTube Data API quota cost per call
+QUOTA_COSTS = {'search': 100, 'videos': 1}
+
+def estimate_tokens(text):
+    """
+    Rough token count for text
+
+    ASCII text averages about four characters per token. Other scripts (such as
+    Devanagari) are split far finer, so each of their characters counts as a token.
+    """
+    if not text:
+        return 0
+    ascii_count = len(text.encode('ascii', 'ignore'))
+    return max(1, ascii_count // 4 + len(text) - ascii_count)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+class Metrics:
+    """
+    Thread-safe registry of counters and latency histograms
+
+    Spans time a stage, add the duration to the `stage_seconds` histogram and,
+    if `trace_path` is set, append one JSON line per span to that file.
+    """
+
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """Clear all recorded counters and histograms"""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def count(self, name, value=1, **labels):
+        """Add `value` to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record one observation in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def count_quota(self, call, calls=1):
+        """Record YouTube API calls and the quota units they cost"""
+        self.count('youtube_api_calls_total', calls, call=call)
+        self.count('youtube_quota_units_total', QUOTA_COSTS[call] * calls, call=call)
+
+    def count_tokens(self, prompt_tokens, response_tokens):
+        """Record Gemini prompt and response token counts"""
+        self.count('gemini_requests_total')
+        self.count('gemini_prompt_tokens_total', prompt_tokens)
+        self.count('gemini_response_tokens_total', response_tokens)
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        """Time a stage of the pipeline"""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        parent = stack[-1] if stack else None
+        stack.append(stage)
+        started_at = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self.observe('stage_seconds', duration, stage=stage)
+            if self.trace_path:
+                event = {'stage': stage, 'parent': parent, 'start': started_at,
+                         'duration_ms': round(duration * 1000, 3), 'thread': threading.current_thread().name}
+                if error:
+                    event['error'] = error
+                event.update(attributes)
+                with self._lock:
+                    with open(self.trace_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def timed(self, stage):
+        """Decorator that runs every call of a function inside a span"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """
+        Return the current values
+
+        Returns:
+            dict: {'counters': {...}, 'histograms': {...}} keyed by name with labels
+        """
+        with self._lock:
+            counters = {name + _format_labels(labels): value for (name, labels), value in self._counters.items()}
+            histograms = {name + _format_labels(labels): {'count': h['count'], 'sum': h['sum']}
+                          for (name, labels), h in self._histograms.items()}
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (counter_name, labels), value in sorted(self._counters.items()):
+                    if counter_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (histogram_name, labels), h in sorted(self._histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    for bound, bucket_count in zip(LATENCY_BUCKETS, h['buckets']):
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {bucket_count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {h['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {h['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+# Shared registry used throughout the application
+metrics = Metrics()
@@ -0,0 +1,95 @@
+"""
+Pipelined analysis for YouTube Video Finder
+Runs the LLM analysis in the background so it overlaps with fetching and display
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from ranking import rank_videos
+from metrics import metrics
+
+class BackgroundAnalysis:
+    """
+    Analysis of a query's candidates that runs on a background thread
+
+    While later search pages are still being fetched, speculate() can start
+    analyzing the shortlist of the pages seen so far, once a page has left it
+    unchanged. When the search is done, start() reuses that analysis if the
+    final shortlist is the same, and otherwise cancels speculation that has not
+    started yet and starts a new analysis. Meanwhile the caller is free to render
+    results.
+
+    `analyze(videos, **kwargs)` must return the best video; start() passes
+    on_best so an early pick can be shown before the explanation arrives.
+    """
+
+    def __init__(self, analyze, query, top_k=None, max_workers=2):
+        self.analyze = analyze
+        self.query = query
+        self.top_k = top_k
+        self.early_pick = None
+        self._future = None
+        self._speculative = {}  # shortlist video IDs -> future
+        self._last_shortlist = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        # One speculative analysis at a time; newer shortlists wait and replace each other
+        self._speculation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculation")
+
+    def _shortlist(self, videos):
+        if self.top_k is not None and len(videos) > self.top_k:
+            return rank_videos(videos, self.query, top_k=self.top_k)
+        return list(videos)
+
+    def speculate(self, videos):
+        """
+        Start analyzing the candidates found so far
+
+        Nothing is started until the shortlist is full (top_k videos) and the
+        latest page left it unchanged, or if it is already being analyzed; a
+        shortlist that keeps changing would mostly cost an extra Gemini call.
+        """
+        if self.top_k is None or len(videos) < self.top_k:
+            return
+        shortlist = self._shortlist(videos)
+        ids = tuple(video['id'] for video in shortlist)
+        with self._lock:
+            stable = ids == self._last_shortlist
+            self._last_shortlist = ids
+            if stable and ids not in self._speculative:
+                self._cancel_speculation()
+                metrics.count('pipeline_speculative_analyses_total')
+                self._speculative[ids] = self._speculation_executor.submit(self.analyze, shortlist)
+
+    def _cancel_speculation(self, keep=None):
+        """Cancel speculative analyses that have not started, except the one for `keep`"""
+        for ids, future in list(self._speculative.items()):
+            if ids != keep and future.cancel():
+                metrics.count('pipeline_speculation_cancelled_total')
+                del self._speculative[ids]
+
+    def start(self, videos):
+        """Start (or reuse) the analysis of the final candidate list"""
+        shortlist = self._shortlist(videos)
+        ids = tuple(video['id'] for video in shortlist)
+        with self._lock:
+            future = self._speculative.get(ids)
+            self._cancel_speculation(keep=ids)
+            if future is not None:
+                metrics.count('pipeline_speculation_hits_total')
+                self._future = future
+            else:
+                self._future = self._executor.submit(self.analyze, shortlist, on_best=self._set_early_pick)
+        self._executor.shutdown(wait=False)
+        self._speculation_executor.shutdown(wait=False)
+
+    def _set_early_pick(self, video):
+        self.early_pick = video
+
+    def wait(self, timeout=None):
+        """Wait for the analysis; returns True if it has finished"""
+        done, _ = wait([self._future], timeout=timeout)
+        return bool(done)
+
+    def result(self):
+        """Return the best video, waiting for the analysis if needed"""
+        return self._future.result()
@@ -0,0 +1,115 @@
+"""
+Local ranking for YouTube Video Finder
+Scores videos against the query with BM25 plus popularity and recency, without an LLM
+"""
+import re
+import datetime
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+VIEWS_WEIGHT = 0.2
+RECENCY_WEIGHT = 0.1
+RECENCY_HALF_LIFE_DAYS = 7
+DEFAULT_TOP_K = 10
+
+TOKEN_SEPARATORS = re.compile(r"[\s|:;,.!?'\"()\[\]{}<>#/\\&+*~_=-]+")
+
+def tokenize(text):
+    """Split text into lowercase terms (keeps Devanagari words intact)"""
+    return [token for token in TOKEN_SEPARATORS.split(text.lower()) if token]
+
+def score_videos(videos, query, now=None):
+    """
+    Score videos for a query
+
+    The score is BM25 over title and channel (scaled to 0-1), plus smaller
+    contributions from log view count and an exponential recency decay.
+
+    Args:
+        videos (list): List of video dictionaries from YouTube search
+        query (str): The original search query
+        now (datetime): Reference time for recency (defaults to the current UTC time)
+
+    Returns:
+        numpy.ndarray: One score per video
+    """
+    import numpy as np  # Imported on first use to keep startup fast
+
+    if not videos:
+        return np.zeros(0)
+
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    documents = [tokenize(f"{video['title']} {video['channel']}") for video in videos]
+
+    # Term frequency matrix: one row per video, one column per query term
+    term_index = {term: col for col, term in enumerate(query_terms)}
+    tf = np.zeros((len(videos), len(query_terms)))
+    for row, document in enumerate(documents):
+        for token in document:
+            col = term_index.get(token)
+            if col is not None:
+                tf[row, col] += 1
+
+    doc_lengths = np.array([len(document) for document in documents], dtype=float)
+    avg_length = max(doc_lengths.mean(), 1.0)
+    doc_freq = (tf > 0).sum(axis=0)
+    idf = np.log((len(videos) - doc_freq + 0.5) / (doc_freq + 0.5) + 1)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / avg_length)
+    relevance = (tf * (BM25_K1 + 1) / (tf + norm[:, None])) @ idf if query_terms else np.zeros(len(videos))
+    if relevance.max() > 0:
+        relevance = relevance / relevance.max()
+
+    views = np.log1p(np.array([float(video.get('views') or 0) for video in videos]))
+    if views.max() > 0:
+        views = views / views.max()
+
+    age_days = np.array([
+        (now - datetime.datetime.fromisoformat(video['published'].replace('Z', '+00:00'))).total_seconds() / 86400
+        if video.get('published') else RECENCY_HALF_LIFE_DAYS * 10
+        for video in videos
+    ])
+    recency = np.power(0.5, np.clip(age_days, 0, None) / RECENCY_HALF_LIFE_DAYS)
+
+    return relevance + VIEWS_WEIGHT * views + RECENCY_WEIGHT * recency
+
+def rank_videos(videos, query, top_k=None):
+    """
+    Sort videos by local score, best first
+
+    Args:
+        videos (list): List of video dictionaries from YouTube search
+        query (str): The original search query
+        top_k (int): Only return this many videos (None for all)
+
+    Returns:
+        list: Videos in ranked order (ties keep search order)
+    """
+    import numpy as np
+
+    scores = score_videos(videos, query)
+    order = np.argsort(-scores, kind='stable')
+    if top_k is not None:
+        order = order[:top_k]
+    return [videos[i] for i in order]
+
+def best_local_video(videos, query, reason=None):
+    """
+    Pick the best video using local ranking only
+
+    Args:
+        videos (list): List of video dictionaries from YouTube search
+        query (str): The original search query
+        reason (str): Analysis text to attach (a default explanation if omitted)
+
+    Returns:
+        dict: Best video with an 'analysis' entry, or None if there are no videos
+    """
+    if not videos:
+        return None
+    best_video = dict(rank_videos(videos, query, top_k=1)[0])
+    best_video['analysis'] = reason or (
+        "Selected by local ranking: best match for the query terms in title and channel, "
+        "weighted by view count and recency."
+    )
+    return best_video
@@ -0,0 +1,313 @@
+"""
+Resilience for API calls in YouTube Video Finder
+Deadlines, jittered exponential backoff, hedged requests and circuit breakers
+"""
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from metrics import metrics
+
+DEFAULT_DEADLINE = 10.0  # seconds for one logical call, including retries
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 0.2  # seconds before the first retry
+DEFAULT_MAX_DELAY = 2.0  # cap on a single backoff sleep
+DEFAULT_FAILURE_THRESHOLD = 5  # consecutive failed calls that open the circuit
+DEFAULT_RESET_TIMEOUT = 30.0  # seconds the circuit stays open before a trial call
+
+# Default hedge delays: roughly the p95 latency of a healthy call
+DEFAULT_HEDGE_AFTER = {'youtube': 1.0, 'gemini': None}
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call does not finish within its deadline"""
+
+class AttemptNotStarted(DeadlineExceeded):
+    """Raised when the deadline passes before any attempt got a thread to run on"""
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the backend while its circuit breaker is open"""
+
+def error_status(error):
+    """Return the HTTP status of an API error, or None if it has none"""
+    # googleapiclient HttpError carries the HTTP response, google.api_core errors an int code
+    response = getattr(error, 'resp', None)
+    status = getattr(response, 'status', None) if response is not None else getattr(error, 'code', None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error):
+    """
+    Decide whether a failed call is worth retrying
+
+    Timeouts, connection errors, rate limiting and server errors are retried.
+    Other client errors (bad request, invalid key, exhausted daily quota) are not.
+
+    Args:
+        error (Exception): Error raised by the call
+
+    Returns:
+        bool: True if the call may succeed when repeated
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = error_status(error)
+    if status is None:
+        return False
+    if status == 403:
+        # Short-term rate limits are retryable, quotaExceeded is not
+        content = getattr(error, 'content', b'') or b''
+        return b'rateLimitExceeded' in content or b'userRateLimitExceeded' in content
+    return status in RETRYABLE_STATUSES
+
+def quota_error_kind(error):
+    """
+    Classify an error caused by the API key running out of quota
+
+    Returns:
+        str: 'daily' for an exhausted daily quota (403 quotaExceeded/dailyLimitExceeded),
+            'rate' for rate limiting (429), or None for any other error
+    """
+    status = error_status(error)
+    content = getattr(error, 'content', b'') or b''
+    if status == 403 and (b'quotaExceeded' in content or b'dailyLimitExceeded' in content):
+        return 'daily'
+    if status == 429:
+        return 'rate'
+    return None
+
+def backoff_delay(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, rng=random):
+    """
+    Jittered exponential backoff ("full jitter")
+
+    Args:
+        attempt (int): Number of the attempt that just failed, starting at 1
+
+    Returns:
+        float: Seconds to sleep, uniform between 0 and min(max_delay, base_delay * 2 ** (attempt - 1))
+    """
+    return rng.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are refused for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Current state, moving from open to half-open once the reset timeout has passed"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return True if a call may go to the backend now"""
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        """Close the circuit after a successful call"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        """Count a failed call and open the circuit once the threshold is reached"""
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    metrics.count('circuit_opened_total', backend=self.name)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """End a call without counting it either way, letting another trial call through"""
+        with self._lock:
+            self._trial_running = False
+
+    def reset(self):
+        """Close the circuit and forget past failures"""
+        self.record_success()
+
+class CallPolicy:
+    """
+    How calls to one backend are made
+
+    call() runs a function under a deadline, retries retryable errors with
+    jittered exponential backoff while the deadline allows, optionally sends a
+    duplicate (hedged) request when the first one is slower than `hedge_after`,
+    and refuses immediately with CircuitOpenError while the backend is unhealthy.
+
+    If `limiter` is set (an object with acquire(blocking=True), such as
+    batch.RateLimiter), every request sent, including retries, waits for it;
+    a hedged duplicate is only sent if the limiter allows it right away.
+    """
+
+    def __init__(self, name, deadline=DEFAULT_DEADLINE, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, hedge_after=None,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.name = name
+        self.deadline = deadline
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.limiter = None
+        # Attempts run on worker threads so a hung call can be abandoned at the deadline
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix=f"{name}-call")
+
+    def call(self, func, hedge=True):
+        """
+        Call func() with deadline, retries, hedging and the circuit breaker
+
+        Args:
+            func (callable): Function making one request; must be safe to run twice
+            hedge (bool): Allow a hedged duplicate request (disable for calls with side effects)
+
+        Returns:
+            Whatever func returns
+
+        Raises:
+            CircuitOpenError: The circuit is open, the backend was not called
+            DeadlineExceeded: No attempt finished before the deadline
+            Exception: The last error from func when it is not retryable or attempts ran out
+        """
+        if not self.breaker.allow():
+            metrics.count('circuit_rejected_total', backend=self.name)
+            raise CircuitOpenError(f"{self.name} circuit is open; skipping call")
+
+        # Waiting for the rate limit before the first request does not count against the deadline
+        if self.limiter is not None:
+            self.limiter.acquire()
+        deadline_at = time.monotonic() + self.deadline if self.deadline else None
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = self._attempt(func, deadline_at, hedge and self.hedge_after is not None)
+            except Exception as e:
+                remaining = deadline_at - time.monotonic() if deadline_at is not None else None
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                if isinstance(e, DeadlineExceeded) or not is_retryable(e) or attempt >= self.max_attempts \
+                        or (remaining is not None and delay >= remaining):
+                    # Neither an exhausted key nor a request that was never sent says anything
+                    # about the backend's health
+                    if quota_error_kind(e) is None and not isinstance(e, AttemptNotStarted):
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.release()
+                    raise
+                metrics.count('api_retries_total', backend=self.name)
+                time.sleep(delay)
+                if self.limiter is not None:
+                    self.limiter.acquire()
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _attempt(self, func, deadline_at, hedge):
+        """Run one attempt, plus a hedged duplicate if the first is slow, and return the first success"""
+        def remaining():
+            return None if deadline_at is None else max(0.0, deadline_at - time.monotonic())
+
+        pending = {self._executor.submit(func)}
+        if hedge:
+            left = remaining()
+            done, _ = wait(pending, timeout=self.hedge_after if left is None else min(self.hedge_after, left))
+            if not done and (remaining() is None or remaining() > 0) \
+                    and (self.limiter is None or self.limiter.acquire(blocking=False)):
+                metrics.count('api_hedged_requests_total', backend=self.name)
+                pending.add(self._executor.submit(func))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        # Attempts still queued behind hung ones never reached the backend
+        never_started = [future.cancel() for future in pending]
+        if error is None and all(never_started):
+            metrics.count('api_attempts_not_started_total', backend=self.name)
+            raise AttemptNotStarted(f"{self.name} call found no free thread within {self.deadline}s")
+        metrics.count('api_deadline_exceeded_total', backend=self.name)
+        raise DeadlineExceeded(f"{self.name} call did not finish within {self.deadline}s")
+
+    def close(self):
+        """Stop the attempt threads: queued attempts are cancelled, running ones are abandoned"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+def get_policy(name):
+    """Return the shared call policy for a backend ('youtube' or 'gemini'), creating a default one"""
+    with _policies_lock:
+        policy = _policies.get(name)
+        if policy is None:
+            policy = _policies[name] = CallPolicy(name, hedge_after=DEFAULT_HEDGE_AFTER.get(name))
+        return policy
+
+def configure_policies(config):
+    """
+    Replace the shared call policies with ones built from configuration values
+
+    Recognised keys, per backend (youtube_*, gemini_*): *_deadline, *_max_attempts,
+    *_hedge_after (seconds, null to disable); and circuit_failure_threshold, circuit_reset_timeout
+    """
+    with _policies_lock:
+        for name in ('youtube', 'gemini'):
+            if name in _policies:
+                _policies[name].close()
+            _policies[name] = CallPolicy(
+                name,
+                deadline=config.get(f"{name}_deadline", DEFAULT_DEADLINE),
+                max_attempts=config.get(f"{name}_max_attempts", DEFAULT_MAX_ATTEMPTS),
+                hedge_after=config.get(f"{name}_hedge_after", DEFAULT_HEDGE_AFTER.get(name)),
+                failure_threshold=config.get("circuit_failure_threshold", DEFAULT_FAILURE_THRESHOLD),
+                reset_timeout=config.get("circuit_reset_timeout", DEFAULT_RESET_TIMEOUT)
+            )
+
+def reset_policies():
+    """Drop the shared policies (and their circuit state) so defaults are rebuilt on next use"""
+    with _policies_lock:
+        for policy in _policies.values():
+            policy.close()
+        _policies.clear()
@@ -0,0 +1,148 @@
+"""
+Search result cache for YouTube Video Finder
+Keeps search_youtube results on disk so repeated queries skip the API
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from config_manager import CACHE_DIR
+
+DEFAULT_CACHE_FILE = os.path.join(CACHE_DIR, "search_cache.db")
+DEFAULT_TTL = 3600  # seconds
+DEFAULT_MAX_ENTRIES = 500
+
+def normalize_query(query):
+    """Lowercase a query and collapse whitespace so equivalent queries share a key"""
+    return " ".join(query.lower().split())
+
+def make_cache_key(query, max_results, min_duration, max_duration, days_ago, min_views=0, languages=None):
+    """
+    Build the cache key for a search
+
+    Args:
+        query (str): Search query
+        max_results (int): Maximum number of results requested
+        min_duration (int): Minimum video duration in seconds
+        max_duration (int): Maximum video duration in seconds
+        days_ago (int): Publish date window in days
+        min_views (int): Minimum view count
+        languages (list): Search languages (None or English only for the default)
+
+    Returns:
+        str: Key that is identical for equivalent searches
+    """
+    key = [normalize_query(query), max_results, min_duration, max_duration, days_ago]
+    if min_views:
+        key.append(min_views)
+    if languages and list(languages) != ['en']:
+        key.append(sorted(languages))
+    return json.dumps(key)
+
+class SearchCache:
+    """
+    SQLite-backed cache of search results with TTL expiry and LRU eviction
+
+    Entries older than `ttl` seconds are treated as misses. When the cache
+    holds more than `max_entries` rows, the least recently used ones are dropped.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            " key TEXT PRIMARY KEY,"
+            " videos TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Look up cached videos for a key
+
+        Expired entries count as misses but are kept (until evicted) so
+        get_stale() can still serve them while the API is unavailable.
+
+        Returns:
+            list: Cached video dictionaries, or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT videos, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE search_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def get_stale(self, key):
+        """
+        Look up cached videos for a key, ignoring the TTL
+
+        Returns:
+            list: Cached video dictionaries, or None if the key was never stored or has been evicted
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT videos FROM search_cache WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key, videos):
+        """Store videos for a key and evict least recently used entries beyond the size limit"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, videos, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps([dict(video) for video in videos]), now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM search_cache WHERE key NOT IN "
+                "(SELECT key FROM search_cache ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Remove all cached entries"""
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache")
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+def cache_from_config(config):
+    """
+    Create a SearchCache from configuration values
+
+    Recognised keys: search_cache_enabled, search_cache_ttl, search_cache_size
+
+    Returns:
+        SearchCache: Configured cache, or None if caching is disabled
+    """
+    if not config.get("search_cache_enabled", True):
+        return None
+    return SearchCache(
+        ttl=config.get("search_cache_ttl", DEFAULT_TTL),
+        max_entries=config.get("search_cache_size", DEFAULT_MAX_ENTRIES)
+    )
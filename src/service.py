@@ -0,0 +1,211 @@
+"""
+HTTP service mode for YouTube Video Finder
+Serves search and recommend endpoints from one long-running process
+"""
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from youtube_search import search_youtube, DEFAULT_QUOTA_BUDGET, DEFAULT_DEDUPE_THRESHOLD, DEFAULT_LANGUAGES
+from llm_analysis import analyze_titles_tournament, DEFAULT_SHARD_SIZE, DEFAULT_PARALLELISM, DEFAULT_PROMPT_TOKEN_BUDGET
+from ranking import DEFAULT_TOP_K
+from search_cache import cache_from_config, make_cache_key
+from video_store import store_from_config
+from verdict_cache import verdict_cache_from_config
+from metrics import metrics
+from config_manager import load_config, key_pool_from_config
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_SERVICE_WORKERS = 8
+MAX_HEADER_LINES = 100
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error"}
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls
+
+    While a call for a key is running, later callers with the same key wait
+    for its result instead of starting their own.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, func):
+        """
+        Run `func` (a coroutine function) for `key`, or join the call already in flight
+
+        Returns:
+            The result of the shared call
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def __len__(self):
+        return len(self._inflight)
+
+class FinderService:
+    """
+    Search and recommend handlers that keep clients, config and caches warm across requests
+
+    Blocking API calls run on a thread pool; identical in-flight requests share one call.
+    """
+
+    def __init__(self, config, max_workers=DEFAULT_SERVICE_WORKERS, reload_config=False):
+        self.config = config
+        self.reload_config = reload_config
+        self.cache = cache_from_config(config)
+        self.video_store = store_from_config(config)
+        self.verdict_cache = verdict_cache_from_config(config)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.flights = SingleFlight()
+
+    def _search_options(self, params):
+        """Read search filters from query parameters"""
+        query = params.get('q', [""])[0].strip()
+        if not query:
+            raise ValueError("Missing required parameter 'q'")
+        options = {'query': query}
+        for name, default in (('max_results', 20), ('min_duration', 240), ('max_duration', 1200), ('days_ago', 14),
+                              ('min_views', 0)):
+            try:
+                options[name] = int(params.get(name, [default])[0])
+            except ValueError:
+                raise ValueError(f"Parameter '{name}' must be an integer")
+        return options
+
+    def _current_config(self):
+        """Return the configuration, picking up edits to config.json when reloading is enabled"""
+        if self.reload_config:
+            self.config = load_config() or self.config
+        return self.config
+
+    def _search(self, options):
+        config = self._current_config()
+        return search_youtube(
+            api_key=config["youtube_api_key"],
+            cache=self.cache,
+            video_store=self.video_store,
+            quota_budget=config.get("search_quota_budget", DEFAULT_QUOTA_BUDGET),
+            key_pool=key_pool_from_config(config, "youtube"),
+            dedupe_threshold=config.get("dedupe_threshold", DEFAULT_DEDUPE_THRESHOLD),
+            languages=config.get("search_languages", DEFAULT_LANGUAGES),
+            local_first=config.get("local_index_enabled", True),
+            **options
+        )
+
+    def _recommend(self, options):
+        videos = self._search(options)
+        config = self._current_config()
+        best_video = analyze_titles_tournament(
+            videos=videos,
+            query=options['query'],
+            api_key=config["gemini_api_key"],
+            top_k=config.get("llm_top_k", DEFAULT_TOP_K),
+            shard_size=config.get("llm_shard_size", DEFAULT_SHARD_SIZE),
+            max_workers=config.get("llm_parallelism", DEFAULT_PARALLELISM),
+            token_budget=config.get("llm_prompt_token_budget", DEFAULT_PROMPT_TOKEN_BUDGET),
+            verdict_cache=self.verdict_cache,
+            key_pool=key_pool_from_config(config, "gemini")
+        )
+        return {'videos': len(videos), 'best': best_video}
+
+    async def search(self, params):
+        """Handle /search: return the filtered candidate videos"""
+        options = self._search_options(params)
+        key = "search|" + make_cache_key(**options)
+        loop = asyncio.get_running_loop()
+        videos = await self.flights.do(key, lambda: loop.run_in_executor(self.executor, self._search, options))
+        return {'query': options['query'], 'videos': [dict(video) for video in videos]}
+
+    async def recommend(self, params):
+        """Handle /recommend: return the best video with its analysis"""
+        options = self._search_options(params)
+        key = "recommend|" + make_cache_key(**options)
+        loop = asyncio.get_running_loop()
+        result = await self.flights.do(key, lambda: loop.run_in_executor(self.executor, self._recommend, options))
+        return {'query': options['query'], **result}
+
+    async def handle(self, method, target):
+        """
+        Route one request
+
+        Returns:
+            tuple: (status code, JSON-serializable body or plain-text string)
+        """
+        url = urlsplit(target)
+        routes = {'/search': self.search, '/recommend': self.recommend}
+        if url.path == '/health':
+            return 200, {'status': 'ok', 'in_flight': len(self.flights)}
+        if url.path == '/metrics':
+            return 200, metrics.to_prometheus()
+        if url.path not in routes:
+            return 404, {'error': f"Unknown endpoint {url.path}"}
+        if method != 'GET':
+            return 405, {'error': "Only GET is supported"}
+        try:
+            return 200, await routes[url.path](parse_qs(url.query))
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+    async def handle_connection(self, reader, writer):
+        """Read one HTTP/1.1 request from the connection and write the response"""
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            for _ in range(MAX_HEADER_LINES):
+                if (await reader.readline()) in (b"\r\n", b"\n", b""):
+                    break
+
+            parts = request_line.split()
+            if len(parts) != 3:
+                status, body = 400, {'error': "Malformed request line"}
+            else:
+                status, body = await self.handle(parts[0], parts[1])
+
+            if isinstance(body, str):
+                payload, content_type = body.encode('utf-8'), "text/plain; version=0.0.4"
+            else:
+                payload, content_type = json.dumps(body, ensure_ascii=False).encode('utf-8'), "application/json"
+            writer.write(
+                f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                f"Content-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Connection: close\r\n\r\n".encode('latin-1') + payload
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def serve(config, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+    """
+    Run the HTTP service until cancelled
+
+    Args:
+        config (dict): Loaded configuration
+        host (str): Interface to listen on
+        port (int): Port to listen on (0 picks a free port)
+        ready (callable): Called with the bound (host, port) once listening
+    """
+    service = FinderService(config, reload_config=True)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    address = server.sockets[0].getsockname()[:2]
+    if ready is not None:
+        ready(address)
+    else:
+        print(f"Serving on http://{address[0]}:{address[1]} (endpoints: /search, /recommend, /health, /metrics)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.executor.shutdown(wait=False)
@@ -0,0 +1,107 @@
+"""
+Startup profiling for YouTube Video Finder
+Reports import and initialization cost per module for cold starts
+"""
+import os
+import sys
+import time
+import subprocess
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# SDKs that are imported lazily on first use
+LAZY_MODULES = ('googleapiclient.discovery', 'google.generativeai', 'numpy')
+
+def parse_importtime(output):
+    """
+    Parse `python -X importtime` output
+
+    Returns:
+        list: (module name, depth, cumulative seconds) in the order reported
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), depth, int(cumulative) / 1e6))
+    return entries
+
+def measure_imports(modules=('main',) + LAZY_MODULES):
+    """
+    Import modules in a fresh interpreter and time them
+
+    Args:
+        modules (tuple): Modules imported in order; later ones only pay for what earlier ones did not load
+
+    Returns:
+        tuple: (cumulative seconds per requested module, seconds per direct dependency of 'main')
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "; ".join(f"import {module}" for module in modules)],
+        cwd=SRC_DIR, capture_output=True, text=True
+    )
+    entries = parse_importtime(result.stderr)
+
+    totals = {}
+    main_children = []
+    pending_children = []
+    for name, depth, seconds in entries:
+        if depth == 0:
+            totals.setdefault(name, seconds)
+            if name == 'main':
+                main_children = pending_children
+            pending_children = []
+        elif depth == 1:
+            pending_children.append((name, seconds))
+    return totals, main_children
+
+def measure_init(config=None):
+    """
+    Time the one-off initialization steps of a run in this process
+
+    Returns:
+        list: (step name, seconds)
+    """
+    from config_manager import load_config, CONFIG_FILE
+    from youtube_client import load_discovery_document, get_client
+
+    def load_gemini():
+        import google.generativeai as genai
+        genai.configure(api_key=(config or {}).get("gemini_api_key") or "profile-key")
+        genai.GenerativeModel('gemini-1.5-flash')
+
+    steps = [
+        # load_config would create a default file, so only time it when one exists
+        ('load_config', load_config if os.path.exists(CONFIG_FILE) else lambda: None),
+        ('youtube discovery document', load_discovery_document),
+        ('youtube client', lambda: get_client((config or {}).get("youtube_api_key") or "profile-key")),
+        ('gemini model', load_gemini),
+    ]
+    timings = []
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            name = f"{name} (failed: {e})"
+        timings.append((name, time.perf_counter() - start))
+    return timings
+
+def print_startup_profile(config=None):
+    """Print import and init costs, slowest first"""
+    totals, main_children = measure_imports()
+
+    print("Import cost (fresh interpreter):")
+    print(f"  {'main (everything loaded at startup)':<44}{totals.get('main', 0) * 1000:>9.1f} ms")
+    for name, seconds in sorted(main_children, key=lambda child: -child[1]):
+        print(f"    {name:<42}{seconds * 1000:>9.1f} ms")
+
+    print("\nLazy imports (paid on first use):")
+    for module in LAZY_MODULES:
+        print(f"  {module:<44}{totals.get(module, 0) * 1000:>9.1f} ms")
+
+    print("\nInitialization (first use, including lazy imports):")
+    for name, seconds in measure_init(config):
+        print(f"  {name:<44}{seconds * 1000:>9.1f} ms")
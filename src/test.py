@@ -5,22 +5,78 @@ Tests functionality without calling real APIs
 """
 import unittest
 import os
+import io
 import sys
+import time
+import threading
+import tempfile
+import json
+import asyncio
+import wave
+import httplib2
+from googleapiclient.errors import HttpError
 from unittest.mock import patch, MagicMock
-from config_manager import load_config
-from text_input import get_text_input
+from concurrent.futures import ThreadPoolExecutor
+from config_manager import load_config, KeyPool
+from text_input import get_text_input, set_animations, animate_dots, transcribe_files, load_calibration, save_calibration
 from youtube_search import parse_duration, search_youtube
-from llm_analysis import analyze_titles
+from llm_analysis import (analyze_titles, analyze_titles_tournament, analyze_query_batch, VerdictParser,
+                          build_prompt, parse_verdict, call_gemini, gemini_client)
+from search_cache import SearchCache, make_cache_key
+from youtube_search import fetch_video_details, estimate_page_size
+from video_store import VideoStore
+from batch import run_batch, QuotaScheduler, AnalysisBatcher
+from youtube_client import get_client, clear_clients
+from ranking import rank_videos
+from verdict_cache import VerdictCache
+from service import FinderService
+from metrics import Metrics, metrics, estimate_tokens
+from benchmark import FakeYouTube, FakeGemini, LatencyModel, percentile
+from startup import parse_importtime
+from video_record import VideoRecord, VideoColumns, parse_timestamp
+from resilience import (CallPolicy, CircuitOpenError, DeadlineExceeded, AttemptNotStarted, reset_policies,
+                        get_policy, configure_policies)
+from pipeline import BackgroundAnalysis
+from dedupe import collapse_duplicates
+from watch import WatchStore, refresh_query, run_watch, WATERMARK_OVERLAP
+from main import main as run_main
 
 class TestYouTubeVideoFinder(unittest.TestCase):
     """Tests for YouTube Video Finder"""
     
+    def setUp(self):
+        """Make every test build its own (mocked) YouTube client and start with closed circuits"""
+        clear_clients()
+        reset_policies()
+    
     def test_parse_duration(self):
         """Test parsing ISO 8601 duration format"""
         self.assertEqual(parse_duration("PT1H22M33S"), 4953)
         self.assertEqual(parse_duration("PT5M30S"), 330)
         self.assertEqual(parse_duration("PT45S"), 45)
         self.assertEqual(parse_duration("PT1H"), 3600)
+        self.assertEqual(parse_duration("P1DT2H"), 93600)
+        self.assertEqual(parse_duration("P0D"), 0)
+    
+    def test_video_columns(self):
+        """Test columnar filtering and the dictionary behaviour of video records"""
+        def detail(video_id, seconds, views):
+            return {'id': video_id, 'title': f"Video {video_id}", 'channel': "Channel",
+                    'published': "2024-01-01T00:00:00Z", 'duration_seconds': seconds,
+                    'views': str(views), 'thumbnail': ""}
+        
+        page = VideoColumns([detail('a', 300, 50), detail('b', 60, 5000), detail('c', 600, 5000)])
+        self.assertEqual(list(page.matching(240, 1200)), [0, 2])
+        self.assertEqual(list(page.matching(240, 1200, min_views=1000)), [2])
+        
+        record = page.records([2])[0]
+        self.assertIsInstance(record, VideoRecord)
+        self.assertEqual(record['duration'], 10.0)
+        self.assertEqual(record['views'], 5000)
+        self.assertEqual({**record, 'analysis': "x"}['id'], 'c')
+        self.assertEqual(record.copy(), dict(record))
+        with self.assertRaises(AttributeError):
+            record.extra = 1
     
     @patch('json.load')
     @patch('builtins.open', new_callable=unittest.mock.mock_open)
@@ -47,7 +103,7 @@ class TestYouTubeVideoFinder(unittest.TestCase):
         query = get_text_input()
         self.assertEqual(query, "test query")
     
-    @patch('googleapiclient.discovery.build')
+    @patch('googleapiclient.discovery.build_from_document')
     def test_search_youtube(self, mock_build):
         """Test YouTube search functionality (mocked)"""
         # Mock YouTube API response
@@ -96,5 +152,960 @@ class TestYouTubeVideoFinder(unittest.TestCase):
         self.assertEqual(result['title'], 'Test Video 2')
         self.assertEqual(result['analysis'], "This is the best video because it's more detailed.")
 
+    def test_search_cache(self):
+        """Test search cache key normalization, TTL expiry and LRU eviction"""
+        cache = SearchCache(path=":memory:", ttl=60, max_entries=2)
+        key = make_cache_key("Python  Tutorial", 20, 240, 1200, 14)
+        self.assertEqual(key, make_cache_key("python tutorial", 20, 240, 1200, 14))
+        self.assertNotEqual(key, make_cache_key("python tutorial", 20, 240, 1200, 7))
+        
+        self.assertIsNone(cache.get(key))
+        cache.set(key, [{'id': 'vid1'}])
+        self.assertEqual(cache.get(key), [{'id': 'vid1'}])
+        
+        cache.set("b", [])
+        cache.set("c", [])
+        self.assertIsNone(cache.get(key))  # evicted as least recently used
+        self.assertEqual(cache.stats()['entries'], 2)
+        
+        cache.ttl = -1
+        self.assertIsNone(cache.get("c"))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 3)
+        self.assertEqual(cache.get_stale("c"), [])  # expired entries stay available as a fallback
+    
+    @patch('youtube_search.get_client')
+    def test_search_youtube_cache_hit(self, mock_get_client):
+        """Test that a cached search does not call the YouTube API"""
+        cache = SearchCache(path=":memory:")
+        cache.set(make_cache_key('test', 20, 240, 1200, 14), [{'id': 'cached_id'}])
+        
+        results = search_youtube('Test', 'test_api_key', cache=cache)
+        self.assertEqual(results, [{'id': 'cached_id'}])
+        mock_get_client.assert_not_called()
+
+    def test_fetch_video_details_incremental(self):
+        """Test that stored videos only refresh stale statistics"""
+        store = VideoStore(path=":memory:", stats_max_age=60)
+        stored = {'title': 'Stored', 'channel': 'C', 'published': '2023-07-01T00:00:00Z',
+                  'duration_seconds': 300, 'views': '10', 'thumbnail': 'http://example.com/t.jpg'}
+        store.save([{**stored, 'id': 'fresh'}, {**stored, 'id': 'stale'}])
+        store._conn.execute("UPDATE videos SET stats_updated_at = 0 WHERE id = 'stale'")
+        
+        youtube = MagicMock()
+        youtube.videos.return_value.list.return_value.execute.side_effect = [
+            {'items': [{
+                'id': 'new',
+                'snippet': {'title': 'New', 'channelTitle': 'C', 'publishedAt': '2023-07-02T00:00:00Z',
+                            'thumbnails': {'high': {'url': 'http://example.com/n.jpg'}}},
+                'contentDetails': {'duration': 'PT6M'},
+                'statistics': {'viewCount': '5'}
+            }]},
+            {'items': [{'id': 'stale', 'statistics': {'viewCount': '99'}}]}
+        ]
+        
+        details = fetch_video_details(youtube, ['new', 'fresh', 'stale'], store)
+        self.assertEqual([d['id'] for d in details], ['new', 'fresh', 'stale'])
+        self.assertEqual(details[2]['views'], '99')
+        calls = youtube.videos.return_value.list.call_args_list
+        self.assertEqual(calls[0].kwargs, {'part': 'snippet,contentDetails,statistics', 'id': 'new'})
+        self.assertEqual(calls[1].kwargs, {'part': 'statistics', 'id': 'stale'})
+        self.assertEqual(set(store.get_many(['new', 'fresh', 'stale'])), {'new', 'fresh', 'stale'})
+        self.assertFalse(store.is_stale(store.get_many(['stale'])['stale']))
+
+    @patch('youtube_search.get_client')
+    def test_search_youtube_local_first(self, mock_get_client):
+        """Test that fresh stored matches answer a search without the API"""
+        store = VideoStore(path=":memory:", stats_max_age=60)
+        recent = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - 86400))
+        stored = {'channel': 'C', 'published': recent, 'duration_seconds': 300, 'views': '10', 'thumbnail': ''}
+        store.save([
+            {**stored, 'id': 'a', 'title': 'Chess openings for beginners'},
+            {**stored, 'id': 'b', 'title': 'Openings in chess explained'},
+            {**stored, 'id': 'c', 'title': 'Chess endgames'},
+            {**stored, 'id': 'd', 'title': 'Chess openings marathon', 'duration_seconds': 5000},
+            {**stored, 'id': 'e', 'title': 'Old chess openings', 'published': '2020-01-01T00:00:00Z'},
+        ])
+        store.save([{**stored, 'id': 'a', 'title': 'Chess openings for beginners', 'views': '20'}])
+
+        results = search_youtube('chess openings', 'key', max_results=2, video_store=store,
+                                 dedupe_threshold=None, local_first=True)
+        self.assertEqual(sorted(video['id'] for video in results), ['a', 'b'])
+        mock_get_client.return_value.search.assert_not_called()
+
+        # Stale view counts send the search back to the API
+        store._conn.execute("UPDATE videos SET stats_updated_at = 0")
+        mock_get_client.return_value.search.return_value.list.return_value.execute.return_value = {'items': []}
+        self.assertEqual(search_youtube('chess openings', 'key', max_results=2, video_store=store,
+                                        local_first=True), [])
+        mock_get_client.return_value.search.assert_called()
+
+    @patch('youtube_search.get_client')
+    def test_search_youtube_language_fan_out(self, mock_get_client):
+        """Test that languages are searched concurrently and their results merged into one videos call"""
+        results_by_language = {'hi': ['h1', 'shared', 'h2'], 'en': ['e1', 'shared'], 'ta': []}
+        overlap = threading.Barrier(3, timeout=5)  # only passes if all three searches run at once
+
+        def search_list(**kwargs):
+            def execute(http=None):
+                overlap.wait()
+                ids = results_by_language[kwargs['relevanceLanguage']]
+                return {'items': [{'id': {'videoId': video_id}} for video_id in ids]}
+            return MagicMock(execute=execute)
+
+        def videos_list(part, id):
+            return MagicMock(execute=lambda http=None: {'items': [{
+                'id': video_id,
+                'snippet': {'title': f"Video {video_id}", 'channelTitle': 'C', 'publishedAt': '2023-07-01T00:00:00Z',
+                            'thumbnails': {'high': {'url': ''}}},
+                'contentDetails': {'duration': 'PT5M'},
+                'statistics': {'viewCount': '1'}
+            } for video_id in id.split(',')]})
+
+        youtube = mock_get_client.return_value
+        youtube.search.return_value.list.side_effect = search_list
+        youtube.videos.return_value.list.side_effect = videos_list
+
+        results = search_youtube('test', 'key', max_results=10, languages=['hi-IN', 'en', 'ta'],
+                                 dedupe_threshold=None)
+        self.assertFalse(overlap.broken)
+        self.assertEqual([video['id'] for video in results], ['h1', 'e1', 'shared', 'h2'])
+        self.assertEqual(youtube.videos.return_value.list.call_count, 1)
+        search_kwargs = {call.kwargs['relevanceLanguage']: call.kwargs
+                         for call in youtube.search.return_value.list.call_args_list}
+        self.assertEqual(search_kwargs['hi']['regionCode'], 'IN')
+        self.assertNotIn('regionCode', search_kwargs['en'])
+        self.assertEqual(search_kwargs['en']['maxResults'], 7)  # the page is split across languages
+        
+        # Languages beyond one page of the budget are dropped rather than skipping the search
+        youtube.search.return_value.list.reset_mock()
+        overlap = threading.Barrier(2, timeout=5)
+        with patch('sys.stdout', new_callable=io.StringIO):
+            results = search_youtube('test', 'key', max_results=10, languages=['hi-IN', 'en', 'ta'],
+                                     dedupe_threshold=None, quota_budget=250)
+        self.assertFalse(overlap.broken)
+        self.assertEqual(sorted(call.kwargs['relevanceLanguage']
+                                for call in youtube.search.return_value.list.call_args_list), ['en', 'hi'])
+        self.assertEqual([video['id'] for video in results], ['h1', 'e1', 'shared', 'h2'])
+        
+        # Nothing is cached when the keys ran out before the search could start
+        cache = SearchCache(path=":memory:")
+        with tempfile.TemporaryDirectory() as tmp, patch('sys.stdout', new_callable=io.StringIO):
+            pool = KeyPool('youtube', [('k1', 50)], path=os.path.join(tmp, "key_usage.json"))
+            self.assertEqual(search_youtube('test', None, cache=cache, key_pool=pool, languages=['hi-IN', 'en']), [])
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_estimate_page_size(self):
+        """Test page size estimation from the observed filter pass rate"""
+        self.assertEqual(estimate_page_size(20, 0, 0), 40)
+        self.assertEqual(estimate_page_size(5, 48, 48), 6)
+        self.assertEqual(estimate_page_size(30, 50, 5), 50)
+    
+    @patch('youtube_search.get_client')
+    def test_search_youtube_pagination(self, mock_get_client):
+        """Test that search follows nextPageToken until max_results is filled"""
+        def video_item(video_id, duration):
+            return {
+                'id': video_id,
+                'snippet': {'title': video_id, 'channelTitle': 'C', 'publishedAt': '2023-07-01T00:00:00Z',
+                            'thumbnails': {'high': {'url': 'http://example.com/t.jpg'}}},
+                'contentDetails': {'duration': duration},
+                'statistics': {'viewCount': '1'}
+            }
+        
+        youtube = mock_get_client.return_value
+        youtube.search.return_value.list.return_value.execute.side_effect = [
+            {'items': [{'id': {'videoId': 'a'}}, {'id': {'videoId': 'b'}}], 'nextPageToken': 'p2'},
+            {'items': [{'id': {'videoId': 'c'}}, {'id': {'videoId': 'd'}}], 'nextPageToken': 'p3'}
+        ]
+        youtube.videos.return_value.list.return_value.execute.side_effect = [
+            {'items': [video_item('a', 'PT5M'), video_item('b', 'PT1M')]},
+            {'items': [video_item('c', 'PT1H'), video_item('d', 'PT6M')]}
+        ]
+        
+        results = search_youtube('test', 'test_api_key', max_results=2)
+        self.assertEqual([video['id'] for video in results], ['a', 'd'])
+        search_calls = youtube.search.return_value.list.call_args_list
+        self.assertIsNone(search_calls[0].kwargs['pageToken'])
+        self.assertEqual(search_calls[1].kwargs['pageToken'], 'p2')
+        
+        youtube.search.return_value.list.reset_mock()
+        self.assertEqual(search_youtube('test', 'test_api_key', max_results=2, quota_budget=50), [])
+        youtube.search.return_value.list.assert_not_called()
+
+    def test_quota_scheduler(self):
+        """Test that the quota scheduler refuses requests beyond the daily budget"""
+        scheduler = QuotaScheduler(daily_units=250, path=None)
+        self.assertTrue(scheduler.reserve(101))
+        self.assertTrue(scheduler.reserve(101))
+        self.assertFalse(scheduler.reserve(101))
+        self.assertEqual(scheduler.remaining(), 48)
+    
+    @patch('batch.QuotaScheduler')
+    @patch('batch.analyze_titles_tournament')
+    @patch('batch.search_youtube')
+    def test_run_batch(self, mock_search, mock_analyze, mock_scheduler):
+        """Test that batch mode writes one JSON line per query"""
+        mock_scheduler.return_value.reserve.return_value = True
+        mock_scheduler.return_value.remaining.return_value = 10000
+        mock_search.side_effect = lambda query, **kwargs: [{'id': query}] if query != 'empty' else []
+        mock_analyze.side_effect = lambda videos, query, **kwargs: {**videos[0], 'analysis': 'ok'}
+        config = {"youtube_api_key": "yt", "gemini_api_key": "gm", "search_cache_enabled": False,
+                  "video_store_enabled": False, "verdict_cache_enabled": False,
+                  "gemini_requests_per_second": 1000, "llm_batch_size": 1}
+        
+        output = io.StringIO()
+        succeeded = run_batch(['one', 'two', 'empty'], config, output=output, max_workers=3,
+                              options={'max_results': 2})
+        records = {record['query']: record for record in map(json.loads, output.getvalue().splitlines())}
+        
+        self.assertEqual(succeeded, 2)
+        self.assertEqual(records['one']['best'], {'id': 'one', 'analysis': 'ok'})
+        self.assertIsNone(records['empty']['best'])
+        self.assertEqual(mock_search.call_args.kwargs['max_results'], 2)
+
+    @patch('batch.CONFIG_RELOAD_INTERVAL', 0)
+    @patch('batch.QuotaScheduler', lambda units: QuotaScheduler(units, path=None))
+    @patch('batch.load_config')
+    @patch('batch.search_youtube', return_value=[])
+    def test_run_batch_reloads_config(self, mock_search, mock_load_config):
+        """Test that a long batch picks up API keys added to the config file"""
+        config = {"youtube_api_key": "old", "gemini_api_key": "gm", "search_cache_enabled": False,
+                  "video_store_enabled": False, "verdict_cache_enabled": False}
+        mock_load_config.return_value = {**config, "youtube_api_key": "new"}
+        run_batch(['one', 'two'], config, output=io.StringIO(), max_workers=1, use_llm=False, reload_config=True)
+        self.assertEqual([call.kwargs['api_key'] for call in mock_search.call_args_list], ['new', 'new'])
+    
+    @patch('batch.QuotaScheduler', lambda units: QuotaScheduler(units, path=None))
+    @patch('batch.search_youtube')
+    def test_run_batch_quota_per_page(self, mock_search):
+        """Test that batch mode charges quota per fetched page and rate limits each request"""
+        limiters = []
+        
+        def search(query, quota_scheduler, **kwargs):
+            limiters.append(get_policy('youtube').limiter)
+            video = {'id': query, 'title': query, 'channel': "Channel", 'published': "2024-01-01T00:00:00Z",
+                     'duration': 10, 'views': 100}
+            if query.startswith('cached'):
+                return [video]
+            # Two pages, like search_youtube reserving each page before fetching it
+            if quota_scheduler.reserve(101) and quota_scheduler.reserve(101):
+                return [video]
+            return []
+        mock_search.side_effect = search
+        config = {"youtube_api_key": "yt", "gemini_api_key": "gm", "search_cache_enabled": False,
+                  "video_store_enabled": False, "verdict_cache_enabled": False, "youtube_daily_quota": 1000}
+        
+        output = io.StringIO()
+        queries = [f'cached {i}' for i in range(30)] + [f'new {i}' for i in range(6)]
+        self.assertEqual(run_batch(queries, config, output=output, max_workers=4, use_llm=False), 34)
+        errors = [record for record in map(json.loads, output.getvalue().splitlines()) if 'error' in record]
+        self.assertEqual(len(errors), 2)  # only the searches that did not fit in the day's 1000 units
+        self.assertTrue(all(limiter is not None for limiter in limiters))
+        self.assertIsNone(get_policy('youtube').limiter)
+
+    @patch('googleapiclient.discovery.build_from_document')
+    def test_get_client_reused(self, mock_build):
+        """Test that clients are built once per API key"""
+        self.assertIs(get_client('key1'), get_client('key1'))
+        get_client('key2')
+        self.assertEqual(mock_build.call_count, 2)
+
+    def test_rank_videos(self):
+        """Test local ranking by query terms, views and recency"""
+        videos = [
+            {'id': 'cooking', 'title': 'Easy pasta recipe', 'channel': 'Kitchen', 'views': '500000',
+             'published': '2023-07-01T00:00:00Z'},
+            {'id': 'python', 'title': 'Python tutorial for beginners', 'channel': 'Code Academy', 'views': '1000',
+             'published': '2023-07-01T00:00:00Z'},
+            {'id': 'python_popular', 'title': 'Python Tutorial - full course', 'channel': 'Dev', 'views': '900000',
+             'published': '2023-07-02T00:00:00Z'}
+        ]
+        ranked = rank_videos(videos, 'python tutorial')
+        self.assertEqual([video['id'] for video in ranked], ['python_popular', 'python', 'cooking'])
+        self.assertEqual(len(rank_videos(videos, 'python tutorial', top_k=1)), 1)
+    
+    @patch('google.generativeai.GenerativeModel')
+    @patch('google.generativeai.configure')
+    def test_analyze_titles_shortlist_and_fallback(self, mock_configure, mock_model):
+        """Test that only the top-k candidates reach Gemini and errors fall back to local ranking"""
+        videos = [
+            {'id': 'vid1', 'title': 'Gardening tips', 'channel': 'Channel 1', 'duration': 10, 'views': '10',
+             'published': '2023-07-01T00:00:00Z'},
+            {'id': 'vid2', 'title': 'Chess openings explained', 'channel': 'Channel 2', 'duration': 15,
+             'views': '10', 'published': '2023-07-01T00:00:00Z'}
+        ]
+        mock_model.return_value.generate_content.side_effect = Exception("service unavailable")
+        
+        result = analyze_titles(videos, 'chess openings', 'test_api_key', top_k=1)
+        prompt = mock_model.return_value.generate_content.call_args.args[0]
+        self.assertIn('Chess openings explained', prompt)
+        self.assertNotIn('Gardening tips', prompt)
+        self.assertEqual(result['id'], 'vid2')
+
+    @patch('google.generativeai.GenerativeModel')
+    @patch('google.generativeai.configure')
+    def test_analyze_titles_verdict_cache(self, mock_configure, mock_model):
+        """Test that a repeated analysis is answered from the verdict cache"""
+        videos = [
+            {'id': 'vid1', 'title': 'Test Video 1', 'channel': 'Channel 1', 'duration': 10},
+            {'id': 'vid2', 'title': 'Test Video 2', 'channel': 'Channel 2', 'duration': 15}
+        ]
+        mock_model.return_value.generate_content.return_value.text = "BEST_VIDEO: 2\nREASON: More detailed."
+        cache = VerdictCache(path=":memory:", max_memory_entries=1)
+        
+        first = analyze_titles(videos, 'Test query', 'test_api_key', verdict_cache=cache)
+        cache.set('other', 'vid1', 'pushes the first verdict out of memory')
+        second = analyze_titles(videos, 'test  QUERY', 'test_api_key', verdict_cache=cache)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(mock_model.return_value.generate_content.call_count, 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        
+        cache.ttl = -1
+        analyze_titles(videos, 'test query', 'test_api_key', verdict_cache=cache)
+        self.assertEqual(mock_model.return_value.generate_content.call_count, 2)
+
+    def test_analyze_titles_streaming(self):
+        """Test that the best video is reported before the streamed reason is complete"""
+        videos = [
+            {'id': 'vid1', 'title': 'Test Video 1', 'channel': 'Channel 1', 'duration': 10},
+            {'id': 'vid2', 'title': 'Test Video 2', 'channel': 'Channel 2', 'duration': 15}
+        ]
+        events = []
+        
+        class FakeStreamingModel:
+            def generate_content(self, prompt, stream=False):
+                for text in ["BEST_", "VIDEO: 1", "\nREASON: Clear", " and concise."]:
+                    events.append(('chunk', text))
+                    yield MagicMock(text=text)
+        
+        result = analyze_titles(videos, 'test query', 'test_api_key', model=FakeStreamingModel(), stream=True,
+                                on_best=lambda video: events.append(('best', video['id'])))
+        
+        self.assertEqual(events.index(('best', 'vid1')), 3)  # right after the BEST_VIDEO line ends
+        self.assertEqual(result['id'], 'vid1')
+        self.assertEqual(result['analysis'], "Clear and concise.")
+        
+        # A stream that breaks after the pick keeps that pick instead of retrying into another answer
+        attempts = []
+        
+        class BrokenStreamingModel:
+            def generate_content(self, prompt, stream=False):
+                attempts.append(prompt)
+                yield MagicMock(text='{"best": 2, "rea')
+                raise ConnectionError("stream reset")
+        
+        picks = []
+        result = analyze_titles(videos, 'test query', 'test_api_key', model=BrokenStreamingModel(), stream=True,
+                                on_best=lambda video: picks.append(video['id']))
+        self.assertEqual((len(attempts), picks, result['id']), (1, ['vid2'], 'vid2'))
+    
+    def test_verdict_parser_fallback_number(self):
+        """Test parsing a BEST_VIDEO line with extra text around the number"""
+        parser = VerdictParser()
+        parser.feed("BEST_VIDEO: Video #3\nREASON: Best one.")
+        parser.close()
+        self.assertEqual(parser.best_index, 2)
+        self.assertEqual(parser.reason, "Best one.")
+
+    def test_compact_prompt_and_json_verdict(self):
+        """Test title truncation, the prompt token budget and strict JSON verdict parsing"""
+        videos = [{'id': f'vid{i}', 'title': f"Chess lesson {i} " + "with a very long title " * 10,
+                   'channel': 'C', 'duration': 5} for i in range(20)]
+        prompt, included = build_prompt(videos, 'chess', token_budget=None)
+        self.assertEqual(len(included), 20)
+        self.assertTrue(all(len(line) < 110 for line in prompt.splitlines() if line[0].isdigit()))
+        self.assertIn("1|Chess lesson 0 with a very long title", prompt)
+
+        prompt, included = build_prompt(videos, 'chess', token_budget=200)
+        self.assertLessEqual(estimate_tokens(prompt), 200)
+        self.assertTrue(0 < len(included) < 20)
+        
+        # Devanagari titles take far more tokens per character than English ones
+        hindi = [{**video, 'title': "शतरंज की शुरुआती चालें सीखें " * 3} for video in videos]
+        self.assertEqual(estimate_tokens("शतरंज"), 5)
+        prompt, included_hindi = build_prompt(hindi, 'शतरंज', token_budget=200)
+        self.assertLessEqual(estimate_tokens(prompt), 200)
+        self.assertLess(len(included_hindi), len(included))
+
+        self.assertEqual(parse_verdict('```json\n{"best": 2, "reason": " Clear. "}\n```', 3), (1, "Clear."))
+        for invalid in ['{"best": 4, "reason": "x"}', '{"best": "2", "reason": "x"}', '{"best": 2}', '[2]', 'BEST']:
+            self.assertIsNone(parse_verdict(invalid, 3))
+
+        parser = VerdictParser(3)
+        for chunk in ['{"be', 'st": 3', ', "reason": "Most', ' detailed."}']:
+            parser.feed(chunk)
+            if chunk.startswith(', '):
+                self.assertEqual(parser.best_index, 2)  # known before the reason is complete
+        parser.close()
+        self.assertEqual((parser.format, parser.best_index, parser.reason), ('json', 2, "Most detailed."))
+
+    def test_analyze_titles_tournament(self):
+        """Test that large pools are analyzed in shards and a final round"""
+        videos = [{'id': f'vid{i}', 'title': f'Video {i}', 'channel': 'C', 'duration': 5} for i in range(25)]
+        prompts = []
+        
+        class FakeModel:
+            def generate_content(self, prompt):
+                prompts.append(prompt)
+                # Always prefer the last option in the prompt
+                options = prompt.count('\n') - 3  # header lines and the reply instructions
+                return MagicMock(text=f"BEST_VIDEO: {options}\nREASON: Last one.")
+        
+        result = analyze_titles_tournament(videos, 'test', 'test_api_key', shard_size=10, model=FakeModel())
+        self.assertEqual(len(prompts), 4)  # 3 shards + final round
+        self.assertEqual(result['id'], 'vid24')
+        self.assertEqual(result['analysis'], "Last one.")
+        
+        # 11 candidates make two shards of 6 and 5 rather than 10 and 1; 3 make a pair and a bye
+        prompts.clear()
+        analyze_titles_tournament(videos[:11], 'test', 'test_api_key', shard_size=10, model=FakeModel())
+        shard_sizes = [sum(line[:1].isdigit() for line in prompt.splitlines()) for prompt in prompts[:2]]
+        self.assertEqual(sorted(shard_sizes), [5, 6])
+        self.assertEqual(len(prompts), 3)
+        prompts.clear()
+        result = analyze_titles_tournament(videos[:3], 'test', 'test_api_key', shard_size=2, model=FakeModel())
+        self.assertEqual((len(prompts), result['id']), (2, 'vid2'))
+
+    def test_analyze_query_batch(self):
+        """Test that several queries share one prompt and unparseable answers are re-run alone"""
+        def candidates(query):
+            return [{'id': f'{query}{i}', 'title': f'{query} video {i}', 'channel': 'C', 'duration': 5}
+                    for i in range(3)]
+        prompts = []
+        
+        class FakeModel:
+            def generate_content(self, prompt):
+                prompts.append(prompt)
+                if len(prompts) == 1:
+                    return MagicMock(text=json.dumps([
+                        {"query": "Q3", "best": 1, "reason": "Third."},
+                        {"query": "Q1", "best": 2, "reason": "First."},
+                        {"query": "Q2", "best": 9, "reason": "Out of range."},
+                    ]))
+                return MagicMock(text='{"best": 3, "reason": "Alone."}')
+        
+        items = [('chess', candidates('chess')), ('go', candidates('go')), ('empty', []), ('shogi', candidates('shogi'))]
+        results = analyze_query_batch(items, 'test_api_key', model=FakeModel())
+        self.assertEqual(len(prompts), 2)
+        self.assertIn('Q3: "shogi"', prompts[0])
+        self.assertIn('Q2: "go"', prompts[0])
+        self.assertEqual([(r['id'], r['analysis']) if r else None for r in results],
+                         [('chess1', "First."), ('go2', "Alone."), None, ('shogi0', "Third.")])
+    
+    def test_analyze_query_batch_fallback_caches_verdict(self):
+        """Test that a query re-run alone after a trimmed batch prompt is cached under its own key"""
+        prompts = []
+        
+        class FakeModel:
+            def generate_content(self, prompt):
+                prompts.append(prompt)
+                if len(prompts) == 1:
+                    return MagicMock(text="not json")
+                return MagicMock(text='{"best": 1, "reason": "Alone."}')
+        
+        items = [(query, [{'id': f'{query}{i}', 'title': f'{query} video {i}', 'channel': 'C', 'duration': 5}
+                          for i in range(3)]) for query in ('chess', 'go')]
+        cache = VerdictCache(path=":memory:")
+        first = analyze_query_batch(items, 'test_api_key', verdict_cache=cache, model=FakeModel(), token_budget=1)
+        self.assertEqual(len(prompts), 3)
+        second = analyze_query_batch(items, 'test_api_key', verdict_cache=cache, model=FakeModel(), token_budget=1)
+        self.assertEqual(len(prompts), 3)
+        self.assertEqual([r['id'] for r in second], [r['id'] for r in first])
+    
+    def test_analysis_batcher(self):
+        """Test that concurrent analysis requests are grouped into batches"""
+        batches = []
+        
+        def analyze_batch(items):
+            batches.append([query for query, _ in items])
+            return [{'id': query} for query, _ in items]
+        
+        batcher = AnalysisBatcher(analyze_batch, batch_size=2, max_wait=0.1)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(lambda query: batcher.analyze(query, [{'id': query}]), ['a', 'b', 'c']))
+        self.assertEqual(results, [{'id': 'a'}, {'id': 'b'}, {'id': 'c'}])
+        self.assertEqual(sorted(len(batch) for batch in batches), [1, 2])
+
+    @patch('service.search_youtube')
+    def test_service_coalesces_requests(self, mock_search):
+        """Test that identical concurrent service requests share one search"""
+        def slow_search(**kwargs):
+            time.sleep(0.1)
+            return [{'id': 'vid1'}]
+        mock_search.side_effect = slow_search
+        service = FinderService({"youtube_api_key": "yt", "gemini_api_key": "gm", "search_cache_enabled": False,
+                                 "video_store_enabled": False, "verdict_cache_enabled": False})
+        
+        async def run():
+            requests = [service.handle('GET', '/search?q=python+tutorial') for _ in range(20)]
+            requests.append(service.handle('GET', '/search?q=other'))
+            return await asyncio.gather(*requests)
+        
+        responses = asyncio.run(run())
+        self.assertTrue(all(status == 200 for status, _ in responses))
+        self.assertEqual(responses[0][1]['videos'], [{'id': 'vid1'}])
+        self.assertEqual(mock_search.call_count, 2)
+        self.assertEqual(asyncio.run(service.handle('GET', '/search'))[0], 400)
+        service.executor.shutdown()
+
+    @patch('youtube_search.get_client')
+    def test_metrics_quota_and_spans(self, mock_get_client):
+        """Test quota accounting, stage histograms and the Prometheus export"""
+        metrics.reset()
+        youtube = mock_get_client.return_value
+        youtube.search.return_value.list.return_value.execute.return_value = {'items': [{'id': {'videoId': 'a'}}]}
+        youtube.videos.return_value.list.return_value.execute.return_value = {'items': []}
+        
+        search_youtube('test', 'test_api_key')
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters']['youtube_quota_units_total{call="search"}'], 100)
+        self.assertEqual(snapshot['counters']['youtube_quota_units_total{call="videos"}'], 1)
+        self.assertEqual(snapshot['histograms']['stage_seconds{stage="search_youtube"}']['count'], 1)
+        self.assertIn('stage_seconds_bucket{stage="youtube.search",le="+Inf"} 1', metrics.to_prometheus())
+    
+    def test_metrics_trace_file(self):
+        """Test that spans are written to the JSONL trace with their parent stage"""
+        with tempfile.TemporaryDirectory() as tmp:
+            trace = Metrics(trace_path=os.path.join(tmp, 'trace.jsonl'))
+            with trace.span('outer'):
+                with trace.span('inner', query='q'):
+                    pass
+            with open(trace.trace_path) as f:
+                events = [json.loads(line) for line in f]
+        self.assertEqual([event['stage'] for event in events], ['inner', 'outer'])
+        self.assertEqual(events[0]['parent'], 'outer')
+        self.assertEqual(events[0]['query'], 'q')
+
+    def test_benchmark_fake_youtube(self):
+        """Test that the benchmark's fake YouTube backend drives search_youtube"""
+        fake = FakeYouTube(LatencyModel(0), total_results=100, pass_rate=0.5, seed=1)
+        with patch('youtube_search.get_client', return_value=fake):
+            results = search_youtube('benchmark', 'key', max_results=10)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(4 <= video['duration'] <= 20 for video in results))
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertAlmostEqual(percentile([1, 2, 3, 4, 5], 95), 4.8)
+
+    @patch('time.sleep')
+    def test_animations_skipped(self, mock_sleep):
+        """Test that progress animations only sleep when enabled"""
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            animate_dots(steps=3, delay=0.3)
+            self.assertEqual(stdout.getvalue(), "...")
+        mock_sleep.assert_not_called()
+        
+        set_animations(True)
+        try:
+            with patch('sys.stdout', new_callable=io.StringIO):
+                animate_dots(steps=3, delay=0.3)
+        finally:
+            set_animations(None)
+        self.assertEqual(mock_sleep.call_count, 3)
+    
+    def test_parse_importtime(self):
+        """Test parsing of python -X importtime output"""
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   text_input\n"
+            "import time:       300 |       1500 | main\n"
+        )
+        self.assertEqual(parse_importtime(output), [('text_input', 1, 0.00012), ('main', 0, 0.0015)])
+
+    @patch('google.generativeai.configure')
+    @patch('main.load_config')
+    def test_ndjson_cli(self, mock_load_config, mock_configure):
+        """Test that the non-interactive CLI streams candidates, the early pick and the recommendation"""
+        mock_load_config.return_value = {"youtube_api_key": "yt", "gemini_api_key": "gm",
+                                         "search_cache_enabled": False, "video_store_enabled": False,
+                                         "verdict_cache_enabled": False}
+        fake_youtube = FakeYouTube(LatencyModel(0), total_results=50, seed=1)
+        fake_gemini = FakeGemini(LatencyModel(0), seed=1)
+        
+        with patch('youtube_search.get_client', return_value=fake_youtube), \
+                patch('google.generativeai.GenerativeModel', return_value=fake_gemini), \
+                patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            exit_code = run_main(['--query', 'python tutorial', '--max-results', '5', '--output-format', 'ndjson'])
+        
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(exit_code, 0)
+        self.assertEqual([record['type'] for record in records], ['video'] * 5 + ['pick', 'recommendation'])
+        self.assertEqual(records[-1]['video']['id'], records[-2]['video']['id'])
+        self.assertTrue(records[-1]['video']['analysis'])
+    
+    @patch('main.run_batch')
+    @patch('main.load_config')
+    def test_batch_cli_passes_filters(self, mock_load_config, mock_run_batch):
+        """Test that --batch searches with the filters given on the command line"""
+        mock_load_config.return_value = {"youtube_api_key": "yt", "gemini_api_key": "gm"}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "queries.txt")
+            with open(path, 'w') as f:
+                f.write("chess\ngo\n")
+            self.assertEqual(run_main(['--batch', path, '--max-results', '2', '--min-views', '10']), 0)
+        
+        options = mock_run_batch.call_args.kwargs['options']
+        self.assertEqual((options['max_results'], options['min_views']), (2, 10))
+    
+    def test_call_policy_retries_and_circuit(self):
+        """Test retries of retryable errors and the circuit breaker opening after repeated failures"""
+        policy = CallPolicy('test', deadline=5, max_attempts=3, base_delay=0, failure_threshold=2, reset_timeout=60)
+        calls = []
+        
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise ConnectionError("reset by peer")
+            return "ok"
+        policy.limiter = MagicMock()
+        self.assertEqual(policy.call(flaky), "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(policy.limiter.acquire.call_count, 3)  # every attempt is rate limited
+        policy.limiter = None
+        
+        def bad_request():
+            calls.append(1)
+            raise ValueError("bad request")
+        calls.clear()
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                policy.call(bad_request)
+        self.assertEqual(len(calls), 2)  # not retried
+        with self.assertRaises(CircuitOpenError):
+            policy.call(bad_request)
+        self.assertEqual(len(calls), 2)  # the open circuit does not call the backend
+    
+    def test_call_policy_hedge_and_deadline(self):
+        """Test that a slow call is hedged and that a hung call stops at the deadline"""
+        policy = CallPolicy('test', deadline=2, hedge_after=0.05)
+        started = []
+        release = threading.Event()
+        
+        def slow_first():
+            started.append(1)
+            if len(started) == 1:
+                release.wait(5)  # only the hedge can answer before the deadline
+            return len(started)
+        self.assertEqual(policy.call(slow_first), 2)
+        release.set()
+        
+        policy = CallPolicy('test', deadline=0.1)
+        with self.assertRaises(DeadlineExceeded):
+            policy.call(lambda: time.sleep(1))
+    
+    def test_call_policy_busy_threads(self):
+        """Test that attempts stuck behind hung ones are not backend failures and replaced policies stop"""
+        policy = CallPolicy('test', deadline=0.1, failure_threshold=1)
+        release = threading.Event()
+        for _ in range(32):
+            policy._executor.submit(release.wait, 5)  # every attempt thread hung
+        with self.assertRaises(AttemptNotStarted):
+            policy.call(lambda: "ok")
+        self.assertTrue(policy.breaker.allow())  # the circuit stays closed
+        release.set()
+        
+        configure_policies({})
+        old = get_policy('youtube')
+        configure_policies({})
+        self.assertIsNot(get_policy('youtube'), old)
+        with self.assertRaises(RuntimeError):
+            old._executor.submit(lambda: None)  # shut down when replaced
+    
+    @patch('youtube_search.get_client')
+    def test_search_youtube_fallback_to_stale_cache(self, mock_get_client):
+        """Test that an API failure serves an expired cached result"""
+        cache = SearchCache(path=":memory:", ttl=-1)
+        cache.set(make_cache_key('test', 20, 240, 1200, 14), [{'id': 'stale_id'}])
+        mock_get_client.return_value.search.return_value.list.return_value.execute.side_effect = TimeoutError()
+        
+        policy = CallPolicy('youtube', deadline=5, max_attempts=2, base_delay=0)
+        results = search_youtube('test', 'test_api_key', cache=cache, policy=policy)
+        self.assertEqual(results, [{'id': 'stale_id'}])
+        self.assertEqual(mock_get_client.return_value.search.return_value.list.return_value.execute.call_count, 2)
+    def test_voice_calibration_cache(self):
+        """Test that the microphone calibration is reused until it is too old"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "calibration.json")
+            self.assertIsNone(load_calibration(path))
+            save_calibration(412.5, path)
+            self.assertEqual(load_calibration(path), 412.5)
+            self.assertIsNone(load_calibration(path, max_age=-1))
+    
+    @patch('speech_recognition.Recognizer.recognize_google')
+    def test_transcribe_audio_files(self, mock_recognize):
+        """Test batch transcription of WAV files, skipping unreadable ones"""
+        mock_recognize.return_value = "python tutorial"
+        with tempfile.TemporaryDirectory() as tmp:
+            with wave.open(os.path.join(tmp, "a.wav"), 'wb') as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(16000)
+                f.writeframes(b"\x00\x00" * 1600)
+            with open(os.path.join(tmp, "b.wav"), 'wb') as f:
+                f.write(b"not audio")
+            
+            with patch('sys.stderr', new_callable=io.StringIO):
+                transcribed = transcribe_files([tmp])
+        
+        self.assertEqual([(os.path.basename(path), query) for path, query in transcribed],
+                         [('a.wav', 'python tutorial'), ('b.wav', None)])
+        self.assertEqual(mock_recognize.call_count, 1)
+    def test_key_pool_rotation(self):
+        """Test that the key with the most quota left is used and exhausted keys are skipped"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "key_usage.json")
+            pool = KeyPool('youtube', [('k1', 300), ('k2', 500)], path=path)
+            self.assertEqual(pool.acquire(101), 'k2')
+            self.assertEqual(pool.acquire(101), 'k2')
+            self.assertEqual(pool.acquire(101), 'k1')  # 298 left on k2, 300 on k1
+            pool.report_exhausted('k1')
+            self.assertEqual(pool.acquire(101), 'k2')
+            self.assertEqual(pool.acquire(101), 'k2')
+            self.assertIsNone(pool.acquire(101))  # 96 left on k2, k1 out of rotation
+            
+            # Usage is shared with later runs on the same day
+            self.assertEqual(KeyPool('youtube', [('k1', 300), ('k2', 500)], path=path).remaining(), 96)
+            
+            # Both services' pools update the same file at once without losing each other's usage
+            youtube = KeyPool('youtube', [('y', 1000)], path=path)
+            gemini = KeyPool('gemini', [('g', 1000)], path=path)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda pool: pool.acquire(), [youtube, gemini] * 100))
+            self.assertEqual(KeyPool('youtube', [('y', 1000)], path=path).remaining(), 900)
+            self.assertEqual(KeyPool('gemini', [('g', 1000)], path=path).remaining(), 900)
+    
+    @patch('youtube_search.get_client')
+    def test_search_youtube_rotates_exhausted_key(self, mock_get_client):
+        """Test that a page refused with quotaExceeded is fetched again with the next key"""
+        quota_error = HttpError(httplib2.Response({'status': 403}),
+                                b'{"error": {"errors": [{"reason": "quotaExceeded"}]}}')
+        youtube = mock_get_client.return_value
+        youtube.search.return_value.list.return_value.execute.side_effect = [
+            quota_error, {'items': [{'id': {'videoId': 'a'}}]}
+        ]
+        youtube.videos.return_value.list.return_value.execute.return_value = {'items': [{
+            'id': 'a',
+            'snippet': {'title': 'a', 'channelTitle': 'C', 'publishedAt': '2024-01-01T00:00:00Z',
+                        'thumbnails': {'high': {'url': 'http://example.com/t.jpg'}}},
+            'contentDetails': {'duration': 'PT5M'},
+            'statistics': {'viewCount': '1'}
+        }]}
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            pool = KeyPool('youtube', [('k1', 1000), ('k2', 900)], path=os.path.join(tmp, "key_usage.json"))
+            results = search_youtube('test', None, key_pool=pool)
+        
+        self.assertEqual([video['id'] for video in results], ['a'])
+        self.assertEqual([call.args[0] for call in mock_get_client.call_args_list], ['k1', 'k2'])
+        self.assertEqual(pool.remaining(), 900 - 101)
+    
+    def test_call_gemini_binds_key_per_request(self):
+        """Test that concurrent Gemini requests each use the client of their own key"""
+        keys = ['k1', 'k2'] * 8
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(lambda key: call_gemini(lambda model: model._client, key), keys))
+        
+        self.assertEqual(clients, [gemini_client(key) for key in keys])
+        self.assertIsNot(gemini_client('k1'), gemini_client('k2'))
+        self.assertEqual(gemini_client('k2')._transport._credentials.token, 'k2')
+    
+    def test_load_config_reloads_on_change(self):
+        """Test that the config file is parsed again only after it changes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "config.json")
+            with open(path, 'w') as f:
+                json.dump({"youtube_api_keys": ["a", "b"], "gemini_api_key": "g"}, f)
+            with patch('config_manager.CONFIG_FILE', path):
+                config = load_config()
+                self.assertEqual(config["youtube_api_key"], "a")
+                with patch('json.load') as mock_json_load:
+                    self.assertEqual(load_config(), config)
+                    mock_json_load.assert_not_called()
+                
+                with open(path, 'w') as f:
+                    json.dump({"youtube_api_key": "c", "gemini_api_key": "g", "llm_top_k": 5}, f)
+                self.assertEqual(load_config()["llm_top_k"], 5)
+    
+    def test_background_analysis_reuses_speculation(self):
+        """Test that an analysis started on early pages is reused when the shortlist does not change"""
+        calls = []
+        
+        def analyze(videos, on_best=None):
+            calls.append([video['id'] for video in videos])
+            return {**videos[0], 'analysis': 'ok'}
+        
+        def video(video_id, title):
+            return {'id': video_id, 'title': title, 'channel': 'C', 'views': '1', 'published': ''}
+        
+        early = [video('a', 'chess openings'), video('b', 'chess openings guide')]
+        analysis = BackgroundAnalysis(analyze, 'chess openings', top_k=2)
+        analysis.speculate(early[:1])  # shortlist not full yet
+        analysis.speculate(early)
+        analysis.speculate(early + [video('c', 'cooking')])  # unchanged by the next page
+        analysis.start(early + [video('c', 'cooking')])
+        self.assertEqual(analysis.result()['id'], 'a')
+        self.assertEqual(calls, [['a', 'b']])
+        
+        # A shortlist seen on only one page is not worth a Gemini call
+        analysis = BackgroundAnalysis(analyze, 'chess openings', top_k=2)
+        analysis.speculate(early)
+        analysis.start(early + [video('d', 'chess openings chess openings')])
+        self.assertEqual(analysis.result()['id'], 'd')
+        self.assertEqual(len(calls), 2)
+        
+        # Speculation that has not started when the final shortlist differs is cancelled
+        release = threading.Event()
+        
+        def slow_analyze(videos, on_best=None):
+            release.wait(5)
+            return analyze(videos)
+        
+        later = early + [video('d', 'chess openings chess openings')]
+        analysis = BackgroundAnalysis(slow_analyze, 'chess openings', top_k=2)
+        analysis.speculate(early)
+        analysis.speculate(early)  # running
+        analysis.speculate(later)
+        analysis.speculate(later)  # queued behind it
+        analysis.start(later + [video('e', 'chess openings chess openings chess openings')])
+        release.set()
+        self.assertEqual(analysis.result()['id'], 'e')
+        analysis._speculation_executor.shutdown(wait=True)
+        self.assertEqual(sorted(calls[2:]), [['a', 'b'], ['e', 'd']])
+    
+    @patch('watch.search_youtube')
+    def test_watch_refresh_incremental(self, mock_search):
+        """Test that watch runs only ask for new videos and re-analyze only when candidates change"""
+        def video(video_id, published):
+            return {'id': video_id, 'title': f"chess {video_id}", 'channel': 'C', 'published': published,
+                    'duration': 10.0, 'views': 1, 'thumbnail': ''}
+        
+        config = {"youtube_api_key": "yt", "gemini_api_key": "gm", "video_store_enabled": False}
+        options = {'max_results': 20, 'min_duration': 240, 'max_duration': 1200, 'days_ago': 14, 'min_views': 0}
+        store = WatchStore(":memory:")
+        analyze = MagicMock(side_effect=lambda videos, query: {**videos[0], 'analysis': 'ok'})
+        now = parse_timestamp("2024-01-10T00:00:00Z")
+        
+        def search(stats, **kwargs):
+            published = [parse_timestamp(video['published']) for video in mock_search.return_value]
+            stats.update(exhausted=True, oldest_published=min(published), newest_published=max(published))
+            return mock_search.return_value
+        mock_search.side_effect = search
+        
+        mock_search.return_value = [video('a', "2024-01-08T00:00:00Z"), video('b', "2024-01-09T00:00:00Z")]
+        first = refresh_query('chess', config, store, options, analyze, now=now)
+        self.assertEqual((first['new'], first['changed']), (2, True))
+        self.assertEqual(mock_search.call_args.kwargs['published_after'], "2023-12-27T00:00:00Z")
+        self.assertEqual(mock_search.call_args.kwargs['order'], 'date')
+        
+        mock_search.return_value = [video('b', "2024-01-09T00:00:00Z")]  # seen again in the overlap
+        second = refresh_query('chess', config, store, options, analyze, now=now + 300)
+        self.assertEqual((second['new'], second['changed']), (0, False))
+        self.assertEqual(mock_search.call_args.kwargs['published_after'],
+                         time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                                       time.gmtime(parse_timestamp("2024-01-09T00:00:00Z") - WATERMARK_OVERLAP)))
+        self.assertEqual(analyze.call_count, 1)
+        self.assertEqual(second['best'], first['best'])
+        
+        mock_search.return_value = [video('c', "2024-01-10T00:01:00Z")]
+        third = refresh_query('chess', config, store, options, analyze, now=now + 600)
+        self.assertEqual((third['new'], third['changed'], third['videos']), (1, True, 3))
+        self.assertEqual(analyze.call_count, 2)
+    
+    @patch('watch.search_youtube')
+    def test_watch_refresh_backfill(self, mock_search):
+        """Test that a refresh cut short by the quota budget moves on and reads the rest on later runs"""
+        start = parse_timestamp("2024-01-01T00:00:00Z")
+        catalog = [{'id': f'v{i}', 'title': f"chess {i}", 'channel': 'C', 'duration': 10.0, 'views': 1,
+                    'thumbnail': '', 'published': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(start + i * 600))}
+                   for i in range(1000)]
+        fetched = []
+        
+        def search(published_after, published_before, stats, **kwargs):
+            after = parse_timestamp(published_after)
+            before = parse_timestamp(published_before) if published_before else float('inf')
+            matches = [video for video in reversed(catalog) if after < parse_timestamp(video['published']) < before]
+            page = matches[:200]  # as much as one search's quota budget reads, newest first
+            fetched.append(len(page))
+            published = [parse_timestamp(video['published']) for video in page]
+            stats.update(exhausted=len(page) == len(matches), oldest_published=min(published, default=None),
+                         newest_published=max(published, default=None))
+            return page
+        mock_search.side_effect = search
+        
+        config = {"youtube_api_key": "yt", "gemini_api_key": "gm", "video_store_enabled": False}
+        options = {'max_results': 20, 'min_duration': 240, 'max_duration': 1200, 'days_ago': 14, 'min_views': 0}
+        store = WatchStore(":memory:")
+        analyze = lambda videos, query: videos[0]
+        now = parse_timestamp(catalog[-1]['published']) + 60
+        
+        records = [refresh_query('chess', config, store, options, analyze, now=now + run) for run in range(8)]
+        self.assertEqual(sum(record['new'] for record in records), 1000)
+        self.assertEqual([record['new'] for record in records[-2:]], [0, 0])
+        self.assertLess(sum(fetched), 1100)  # each video about once, plus the hour of overlap per run
+        self.assertEqual(fetched[-1], 6)
+        self.assertIsNone(store.get(make_cache_key('chess', 20, 240, 1200, 14, 0))['backfill'])
+        self.assertEqual(records[-1]['best']['id'], 'v999')
+    
+    @patch('watch.store_from_config')
+    @patch('watch.load_config')
+    @patch('watch.search_youtube')
+    def test_run_watch_reloads_config(self, mock_search, mock_load_config, mock_store_from_config):
+        """Test that each watch run picks up API keys added to the config file but keeps its video store"""
+        mock_search.side_effect = lambda stats, **kwargs: stats.update(
+            exhausted=True, oldest_published=None, newest_published=None) or []
+        config = {"youtube_api_key": "old", "gemini_api_key": "gm", "video_store_enabled": False}
+        mock_load_config.side_effect = [config, {**config, "youtube_api_key": "new"}]
+        options = {'max_results': 5, 'min_duration': 240, 'max_duration': 1200, 'days_ago': 14, 'min_views': 0}
+        
+        output = io.StringIO()
+        run_watch(['chess'], config, options, interval=0, runs=2, output=output, use_llm=False,
+                  store=WatchStore(":memory:"), reload_config=True)
+        self.assertNotIn('error', output.getvalue())
+        self.assertEqual([call.kwargs['api_key'] for call in mock_search.call_args_list], ['old', 'new'])
+        self.assertEqual(mock_store_from_config.call_count, 1)
+        self.assertTrue(all(call.kwargs['video_store'] is mock_store_from_config.return_value
+                            for call in mock_search.call_args_list))
+    
+    def test_collapse_duplicates(self):
+        """Test that reuploads collapse into the most viewed copy, in place of the first one seen"""
+        def video(video_id, title, views):
+            return {'id': video_id, 'title': title, 'views': str(views), 'published': "2024-01-01T00:00:00Z"}
+        
+        videos = [
+            video('a', "Chess Openings for Beginners - Complete Guide", 100),
+            video('b', "Rook endgames explained", 50),
+            video('c', "Chess Openings for Beginners - Complete Guide (Official HD Reupload)", 900),
+            video('d', "Chess openings for advanced players", 10),
+        ]
+        self.assertEqual([v['id'] for v in collapse_duplicates(videos)], ['c', 'b', 'd'])
+        self.assertEqual(len(collapse_duplicates(videos, threshold=1.01)), 4)
+    
+    @patch('youtube_search.get_client')
+    def test_search_youtube_reports_replaced_duplicates(self, mock_get_client):
+        """Test that a better near-duplicate found later is reported to the streaming callbacks"""
+        def detail(video_id, title, views):
+            return {'id': video_id,
+                    'snippet': {'title': title, 'channelTitle': 'C', 'publishedAt': '2024-01-01T00:00:00Z',
+                                'thumbnails': {'high': {'url': 'http://example.com/t.jpg'}}},
+                    'contentDetails': {'duration': 'PT5M'}, 'statistics': {'viewCount': str(views)}}
+        
+        youtube = mock_get_client.return_value
+        youtube.search.return_value.list.return_value.execute.return_value = {
+            'items': [{'id': {'videoId': video_id}} for video_id in ('a', 'b', 'c')]
+        }
+        youtube.videos.return_value.list.return_value.execute.return_value = {'items': [
+            detail('a', "Chess Openings for Beginners - Complete Guide", 100),
+            detail('b', "Rook endgames explained", 50),
+            detail('c', "Chess Openings for Beginners - Complete Guide (Official HD Reupload)", 900),
+        ]}
+        
+        streamed = {}
+        results = search_youtube('chess', 'key', max_results=3,
+                                 on_video=lambda video: streamed.update({video['id']: video}),
+                                 on_replace=lambda old, new: streamed.update({old['id']: new}))
+        self.assertEqual([video['id'] for video in results], ['c', 'b'])
+        self.assertEqual([video['id'] for video in streamed.values()], ['c', 'b'])
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -2,8 +2,41 @@
 Text and voice input handling for YouTube Video Finder
 Supports both text input and basic voice recognition
 """
+import os
 import sys
+import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+from config_manager import CACHE_DIR
+
+CALIBRATION_FILE = os.path.join(CACHE_DIR, "voice_calibration.json")
+CALIBRATION_MAX_AGE = 24 * 3600  # seconds before the microphone is calibrated again
+DEFAULT_PAUSE_THRESHOLD = 0.5  # seconds of silence that end a phrase (SpeechRecognition default: 0.8)
+DEFAULT_PHRASE_TIME_LIMIT = 10  # seconds of speech captured at most
+DEFAULT_LISTEN_TIMEOUT = 5  # seconds to wait for speech to start
+AUDIO_FILE_EXTENSIONS = ('.wav', '.flac', '.aif', '.aiff')
+
+# None means animate only when stdout is a terminal
+_animations = None
+
+def set_animations(enabled):
+    """Force cosmetic animations on or off (None restores the terminal check)"""
+    global _animations
+    _animations = enabled
+
+def animations_enabled():
+    """Return True if cosmetic delays should be shown"""
+    if _animations is not None:
+        return _animations
+    return sys.stdout.isatty()
+
+def animate_dots(steps=3, delay=0.3):
+    """Print dots one by one, pausing between them only when animations are enabled"""
+    animate = animations_enabled()
+    for _ in range(steps):
+        if animate:
+            time.sleep(delay)
+        print(".", end="", flush=True)
 
 def print_colored(text, color=None, style=None):
     """Print colored text if supported by the terminal"""
@@ -85,17 +118,118 @@ def get_text_input():
     print_colored(f"\n🔎 Searching for: '{query}'", 'cyan')
     # Add loading animation
     print("Processing", end="")
-    for _ in range(3):
-        time.sleep(0.3)
-        print(".", end="", flush=True)
+    animate_dots(steps=3, delay=0.3)
     print("\n")
     
     return query
 
-def get_voice_input():
+def load_calibration(path=CALIBRATION_FILE, max_age=CALIBRATION_MAX_AGE):
+    """
+    Load the microphone energy threshold saved by an earlier run
+
+    Returns:
+        float: Energy threshold, or None if there is none or it is older than max_age seconds
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            calibration = json.load(f)
+        if time.time() - calibration['saved_at'] > max_age:
+            return None
+        return float(calibration['energy_threshold'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def save_calibration(energy_threshold, path=CALIBRATION_FILE):
+    """Save the microphone energy threshold for later runs"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'energy_threshold': energy_threshold, 'saved_at': time.time()}, f)
+    except OSError:
+        pass  # Calibration is only an optimization
+
+def make_recognizer(sr, pause_threshold=DEFAULT_PAUSE_THRESHOLD):
+    """
+    Create a recognizer tuned for short spoken queries
+
+    Capture ends after `pause_threshold` seconds of silence instead of the
+    library default of 0.8, and the energy threshold keeps adapting while listening.
+    """
+    recognizer = sr.Recognizer()
+    recognizer.pause_threshold = pause_threshold
+    recognizer.non_speaking_duration = min(recognizer.non_speaking_duration, pause_threshold)
+    recognizer.dynamic_energy_threshold = True
+    return recognizer
+
+def transcribe_file(path, recognizer=None):
+    """
+    Transcribe a pre-recorded WAV, AIFF or FLAC file into a query
+
+    Args:
+        path (str): Audio file path
+        recognizer: speech_recognition.Recognizer to use (a new one if omitted)
+
+    Returns:
+        str: Recognized text, or None if the file could not be read or understood
+    """
+    import speech_recognition as sr
+
+    recognizer = recognizer or make_recognizer(sr)
+    try:
+        with sr.AudioFile(path) as source:
+            audio = recognizer.record(source)
+        return recognizer.recognize_google(audio).strip() or None
+    except sr.UnknownValueError:
+        print(f"Could not understand audio in {path}", file=sys.stderr)
+    except sr.RequestError as e:
+        print(f"Speech recognition service error for {path}: {e}", file=sys.stderr)
+    except (OSError, ValueError, EOFError) as e:
+        print(f"Could not read audio file {path}: {e}", file=sys.stderr)
+    return None
+
+def expand_audio_paths(paths):
+    """Expand directories into the audio files they contain, sorted by name"""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(AUDIO_FILE_EXTENSIONS)
+            )
+        else:
+            expanded.append(path)
+    return expanded
+
+def transcribe_files(paths, max_workers=4):
+    """
+    Transcribe many audio files into queries
+
+    Recognition is a network call, so several files are transcribed at once.
+
+    Args:
+        paths (list): Audio files or directories of audio files
+        max_workers (int): Number of files transcribed at once
+
+    Returns:
+        list: (path, query or None) in the order of the files
+    """
+    try:
+        import speech_recognition  # noqa: F401 - checked here for a clear error message
+    except ImportError:
+        print_colored("❌ SpeechRecognition package not installed. Install with: pip install SpeechRecognition", 'red')
+        return []
+
+    paths = expand_audio_paths(paths)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return list(zip(paths, executor.map(transcribe_file, paths)))
+
+def get_voice_input(pause_threshold=DEFAULT_PAUSE_THRESHOLD, phrase_time_limit=DEFAULT_PHRASE_TIME_LIMIT):
     """
     Get search query from voice input
     Requires the SpeechRecognition package
+
+    The microphone is calibrated for ambient noise only when no calibration
+    from the last day is saved, and capture ends as soon as the speaker pauses.
     """
     try:
         import speech_recognition as sr
@@ -105,27 +239,26 @@ def get_voice_input():
         print_colored("   Falling back to text input.", 'yellow')
         return get_text_input()
     
-    recognizer = sr.Recognizer()
+    recognizer = make_recognizer(sr, pause_threshold)
+    energy_threshold = load_calibration()
     
     with sr.Microphone() as source:
         print_colored("\n🎤 Listening... Speak your search query (Hindi or English)", 'magenta', 'bold')
         print_colored("   (Speak clearly into your microphone)", 'white')
         try:
-            # Show preparation
-            print_colored("   Adjusting for ambient noise...", 'yellow')
-            recognizer.adjust_for_ambient_noise(source)
+            # Reuse the saved calibration; it keeps adapting while listening
+            if energy_threshold is None:
+                print_colored("   Adjusting for ambient noise...", 'yellow')
+                recognizer.adjust_for_ambient_noise(source)
+            else:
+                recognizer.energy_threshold = energy_threshold
             
             print_colored("   Ready! Speak now...", 'green', 'bold')
-            audio = recognizer.listen(source, timeout=5)
+            audio = recognizer.listen(source, timeout=DEFAULT_LISTEN_TIMEOUT, phrase_time_limit=phrase_time_limit)
+            save_calibration(recognizer.energy_threshold)
             
             # Try recognition with Google (supports multiple languages)
             print_colored("   Processing speech...", 'cyan')
-            # Add loading animation
-            print("   ", end="")
-            for _ in range(5):
-                time.sleep(0.3)
-                print(".", end="", flush=True)
-            print()
             
             query = recognizer.recognize_google(audio)
             print_colored(f"\n✅ You said: '{query}'", 'green', 'bold')
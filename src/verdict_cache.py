@@ -0,0 +1,125 @@
+"""
+LLM verdict cache for YouTube Video Finder
+Remembers which video Gemini chose for a query and candidate list
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from config_manager import CACHE_DIR
+from search_cache import normalize_query
+
+DEFAULT_VERDICT_FILE = os.path.join(CACHE_DIR, "verdicts.db")
+DEFAULT_TTL = 24 * 3600  # seconds
+DEFAULT_MEMORY_ENTRIES = 256
+
+def make_verdict_key(query, videos):
+    """
+    Build the cache key for an analysis
+
+    Args:
+        query (str): The original search query
+        videos (list): Candidate videos in the order they are given to the LLM
+
+    Returns:
+        str: Normalized query plus a hash of the ordered candidate IDs
+    """
+    ids_hash = hashlib.sha1(",".join(video['id'] for video in videos).encode('utf-8')).hexdigest()
+    return f"{normalize_query(query)}|{ids_hash}"
+
+class VerdictCache:
+    """
+    Two-tier cache of LLM verdicts: an in-memory LRU in front of SQLite
+
+    Each verdict is the chosen video ID and the reason. Entries older than `ttl`
+    seconds are ignored in both tiers.
+    """
+
+    def __init__(self, path=DEFAULT_VERDICT_FILE, ttl=DEFAULT_TTL, max_memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " key TEXT PRIMARY KEY,"
+            " video_id TEXT NOT NULL,"
+            " reason TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Look up a verdict
+
+        Returns:
+            tuple: (video_id, reason), or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self._conn.execute(
+                    "SELECT video_id, reason, created_at FROM verdicts WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1], row[2])
+                    self._remember(key, entry)
+
+            if entry is None or now - entry[2] > self.ttl:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def set(self, key, video_id, reason):
+        """Store a verdict in both tiers and drop expired rows from disk"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, (video_id, reason, now))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, video_id, reason, created_at) VALUES (?, ?, ?, ?)",
+                (key, video_id, reason, now)
+            )
+            self._conn.execute("DELETE FROM verdicts WHERE created_at < ?", (now - self.ttl,))
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the number of in-memory entries"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'memory_entries': len(self._memory)}
+
+def verdict_cache_from_config(config):
+    """
+    Create a VerdictCache from configuration values
+
+    Recognised keys: verdict_cache_enabled, verdict_cache_ttl, verdict_cache_memory_size
+
+    Returns:
+        VerdictCache: Configured cache, or None if the cache is disabled
+    """
+    if not config.get("verdict_cache_enabled", True):
+        return None
+    return VerdictCache(
+        ttl=config.get("verdict_cache_ttl", DEFAULT_TTL),
+        max_memory_entries=config.get("verdict_cache_memory_size", DEFAULT_MEMORY_ENTRIES)
+    )
@@ -0,0 +1,123 @@
+"""
+Compact video records for YouTube Video Finder
+Typed per-video records and a columnar page representation for fast filtering
+"""
+import re
+import datetime
+from collections.abc import Mapping
+
+DURATION_PATTERN = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+def parse_duration_seconds(duration_str):
+    """
+    Parse an ISO 8601 duration (e.g. PT1H22M33S, P1DT2H, P0D) to seconds
+
+    Returns:
+        int: Duration in seconds (0 if the string is not a valid duration)
+    """
+    match = DURATION_PATTERN.match(duration_str)
+    if not match:
+        return 0
+    days, hours, minutes, seconds = (int(part) if part else 0 for part in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def parse_timestamp(date_str):
+    """Parse an ISO 8601 timestamp such as 2023-07-01T00:00:00Z to epoch seconds"""
+    return datetime.datetime.fromisoformat(date_str.replace('Z', '+00:00')).timestamp()
+
+class VideoRecord(Mapping):
+    """
+    Read-only video record with numeric fields parsed once
+
+    Uses __slots__ to keep memory low for large result sets and behaves like
+    the video dictionaries used elsewhere: video['title'], {**video}, dict(video)
+    and video.copy() all work, and 'duration' is reported in minutes.
+    """
+
+    __slots__ = ('id', 'title', 'channel', 'published', 'duration_seconds', 'views', 'thumbnail')
+
+    KEYS = ('id', 'title', 'channel', 'published', 'duration', 'views', 'thumbnail')
+
+    def __init__(self, id, title, channel, published, duration_seconds, views, thumbnail):
+        self.id = id
+        self.title = title
+        self.channel = channel
+        self.published = published
+        self.duration_seconds = int(duration_seconds)
+        self.views = int(views or 0)
+        self.thumbnail = thumbnail
+
+    @property
+    def duration(self):
+        """Duration in minutes, rounded to one decimal"""
+        return round(self.duration_seconds / 60, 1)
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return f"VideoRecord({dict(self)!r})"
+
+    def copy(self):
+        """Return a plain, mutable dictionary copy"""
+        return dict(self)
+
+class VideoColumns:
+    """
+    Column-oriented page of video details
+
+    Durations, view counts and publish times are parsed once per page into
+    NumPy arrays so filters run over the whole page at once.
+    """
+
+    def __init__(self, details):
+        import numpy as np  # Imported on first use to keep startup fast
+
+        self.details = details
+        self.duration_seconds = np.array([detail['duration_seconds'] for detail in details], dtype=np.int64)
+        self.views = np.array([int(detail['views'] or 0) for detail in details], dtype=np.int64)
+        self.published = np.array([parse_timestamp(detail['published']) for detail in details], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.details)
+
+    def matching(self, min_duration, max_duration, min_views=0, published_after=None):
+        """
+        Indices of videos that pass every filter, in page order
+
+        Args:
+            min_duration (int): Minimum duration in seconds
+            max_duration (int): Maximum duration in seconds
+            min_views (int): Minimum view count
+            published_after (float): Earliest publish time as epoch seconds (None for no limit)
+
+        Returns:
+            numpy.ndarray: Indices of matching videos
+        """
+        import numpy as np
+
+        mask = (self.duration_seconds >= min_duration) & (self.duration_seconds <= max_duration)
+        if min_views:
+            mask &= self.views >= min_views
+        if published_after is not None:
+            mask &= self.published >= published_after
+        return np.flatnonzero(mask)
+
+    def records(self, indices):
+        """Build VideoRecord objects for the given indices"""
+        return [
+            VideoRecord(
+                self.details[i]['id'], self.details[i]['title'], self.details[i]['channel'],
+                self.details[i]['published'], int(self.duration_seconds[i]), int(self.views[i]),
+                self.details[i]['thumbnail']
+            )
+            for i in indices
+        ]
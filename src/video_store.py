@@ -0,0 +1,160 @@
+"""
+Video details store for YouTube Video Finder
+Keeps per-video metadata across searches so only statistics need refreshing
+"""
+import os
+import time
+import sqlite3
+import threading
+from config_manager import CACHE_DIR
+from ranking import tokenize
+
+DEFAULT_STORE_FILE = os.path.join(CACHE_DIR, "videos.db")
+DEFAULT_STATS_MAX_AGE = 6 * 3600  # seconds
+
+FIELDS = ('id', 'title', 'channel', 'published', 'duration_seconds', 'views', 'thumbnail')
+
+class VideoStore:
+    """
+    SQLite-backed store of video details keyed by video ID
+
+    Title, channel, publish date, duration and thumbnail never change and are
+    kept permanently. View counts are considered stale after `stats_max_age` seconds.
+    Titles and channels are also kept in an FTS5 full-text index, so queries can
+    be answered from videos fetched earlier (see search()).
+    """
+
+    def __init__(self, path=DEFAULT_STORE_FILE, stats_max_age=DEFAULT_STATS_MAX_AGE):
+        self.path = path
+        self.stats_max_age = stats_max_age
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            " id TEXT PRIMARY KEY,"
+            " title TEXT NOT NULL,"
+            " channel TEXT NOT NULL,"
+            " published TEXT NOT NULL,"
+            " duration_seconds INTEGER NOT NULL,"
+            " views TEXT NOT NULL,"
+            " thumbnail TEXT NOT NULL,"
+            " stats_updated_at REAL NOT NULL)"
+        )
+        indexed = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'videos_fts'"
+        ).fetchone()
+        if not indexed:
+            # Index rows share the rowid of their video, which save() keeps stable
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE videos_fts USING fts5("
+                " title, channel, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            # Index the videos stored before the index existed
+            self._conn.execute("INSERT INTO videos_fts (rowid, title, channel) SELECT rowid, title, channel FROM videos")
+        self._conn.commit()
+
+    def get_many(self, video_ids):
+        """
+        Look up stored details for several videos
+
+        Returns:
+            dict: Video ID => details dictionary (with 'stats_updated_at') for known IDs
+        """
+        if not video_ids:
+            return {}
+        placeholders = ",".join("?" * len(video_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(FIELDS)}, stats_updated_at FROM videos WHERE id IN ({placeholders})",
+                list(video_ids)
+            ).fetchall()
+        return {row[0]: dict(zip(FIELDS + ('stats_updated_at',), row)) for row in rows}
+
+    def search(self, query, min_duration, max_duration, published_after, min_views=0, limit=50):
+        """
+        Find stored videos matching every word of a query and the search filters
+
+        Only videos whose statistics are still fresh are returned, so view counts
+        are as current as if the videos had just been fetched.
+
+        Args:
+            query (str): Search query
+            min_duration (int): Minimum duration in seconds
+            max_duration (int): Maximum duration in seconds
+            published_after (float): Earliest publish time as epoch seconds
+            min_views (int): Minimum view count
+            limit (int): Maximum number of videos to return
+
+        Returns:
+            list: Details dictionaries (see FIELDS), best full-text matches first
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        published_cutoff = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(published_after))
+        columns = ", ".join(f"v.{field}" for field in FIELDS)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM videos_fts JOIN videos v ON v.rowid = videos_fts.rowid"
+                " WHERE videos_fts MATCH ?"
+                " AND v.duration_seconds BETWEEN ? AND ?"
+                " AND v.published >= ?"
+                " AND CAST(v.views AS INTEGER) >= ?"
+                " AND v.stats_updated_at >= ?"
+                " ORDER BY bm25(videos_fts, 10.0, 1.0) LIMIT ?",
+                (match, min_duration, max_duration, published_cutoff, min_views,
+                 time.time() - self.stats_max_age, limit)
+            ).fetchall()
+        return [dict(zip(FIELDS, row)) for row in rows]
+
+    def is_stale(self, details):
+        """Return True if the stored statistics are older than the freshness window"""
+        return time.time() - details['stats_updated_at'] > self.stats_max_age
+
+    def save(self, videos):
+        """Store full details (see FIELDS) for newly fetched videos"""
+        now = time.time()
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE keeps the rowid the full-text index refers to
+            self._conn.executemany(
+                f"INSERT INTO videos ({', '.join(FIELDS)}, stats_updated_at) "
+                f"VALUES ({', '.join('?' * (len(FIELDS) + 1))}) "
+                f"ON CONFLICT(id) DO UPDATE SET "
+                f"{', '.join(f'{field} = excluded.{field}' for field in FIELDS[1:])}, "
+                f"stats_updated_at = excluded.stats_updated_at",
+                [tuple(video[field] for field in FIELDS) + (now,) for video in videos]
+            )
+            ids = [(video['id'],) for video in videos]
+            self._conn.executemany("DELETE FROM videos_fts WHERE rowid = (SELECT rowid FROM videos WHERE id = ?)", ids)
+            self._conn.executemany(
+                "INSERT INTO videos_fts (rowid, title, channel) SELECT rowid, title, channel FROM videos WHERE id = ?",
+                ids
+            )
+            self._conn.commit()
+
+    def update_statistics(self, views_by_id):
+        """Refresh view counts for known videos"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE videos SET views = ?, stats_updated_at = ? WHERE id = ?",
+                [(views, now, video_id) for video_id, views in views_by_id.items()]
+            )
+            self._conn.commit()
+
+def store_from_config(config):
+    """
+    Create a VideoStore from configuration values
+
+    Recognised keys: video_store_enabled, video_stats_max_age
+
+    Returns:
+        VideoStore: Configured store, or None if the store is disabled
+    """
+    if not config.get("video_store_enabled", True):
+        return None
+    return VideoStore(stats_max_age=config.get("video_stats_max_age", DEFAULT_STATS_MAX_AGE))
@@ -0,0 +1,260 @@
+"""
+Watch mode for YouTube Video Finder
+Re-runs queries incrementally, only fetching videos published since the last run
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import sqlite3
+import threading
+from config_manager import CACHE_DIR, load_config, key_pool_from_config
+from youtube_search import search_youtube, DEFAULT_QUOTA_BUDGET, DEFAULT_DEDUPE_THRESHOLD, DEFAULT_LANGUAGES
+from llm_analysis import analyze_titles_tournament, DEFAULT_SHARD_SIZE, DEFAULT_PARALLELISM, DEFAULT_PROMPT_TOKEN_BUDGET
+from ranking import rank_videos, best_local_video, DEFAULT_TOP_K
+from search_cache import make_cache_key
+from video_store import store_from_config
+from verdict_cache import verdict_cache_from_config
+from video_record import parse_timestamp
+from dedupe import collapse_duplicates
+
+DEFAULT_WATCH_FILE = os.path.join(CACHE_DIR, "watch.db")
+DEFAULT_INTERVAL = 300  # seconds between runs
+# Search results can show up in the index a while after their publish time,
+# so each run looks back this far before the newest video already seen
+WATERMARK_OVERLAP = 3600  # seconds
+# New videos one refresh may collect before ranking; the quota budget usually stops paging first
+INCREMENTAL_MAX_RESULTS = 500
+
+def format_timestamp(timestamp):
+    """Format epoch seconds as an RFC 3339 UTC timestamp for publishedAfter"""
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class WatchStore:
+    """
+    SQLite-backed state of watched queries
+
+    For each query and filter combination it keeps the newest publish time
+    seen (the watermark), the current candidate set and the last recommendation.
+    """
+
+    def __init__(self, path=DEFAULT_WATCH_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS watches ("
+            " key TEXT PRIMARY KEY,"
+            " watermark REAL NOT NULL,"
+            " videos TEXT NOT NULL,"
+            " best TEXT,"
+            " updated_at REAL NOT NULL,"
+            " backfill_after REAL,"
+            " backfill_before REAL)"
+        )
+        # Watch files written before backfilling was tracked
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(watches)")}
+        if 'backfill_after' not in columns:
+            self._conn.execute("ALTER TABLE watches ADD COLUMN backfill_after REAL")
+            self._conn.execute("ALTER TABLE watches ADD COLUMN backfill_before REAL")
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Look up the state of a watched query
+
+        Returns:
+            dict: {'watermark', 'videos', 'best', 'backfill'}, or None for a query not watched before;
+                'backfill' is the (after, before) range of epoch seconds still to be read, or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark, videos, best, backfill_after, backfill_before FROM watches WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'watermark': row[0], 'videos': json.loads(row[1]), 'best': json.loads(row[2]) if row[2] else None,
+                'backfill': (row[3], row[4]) if row[3] is not None else None}
+
+    def save(self, key, watermark, videos, best, backfill=None):
+        """Store the state of a watched query"""
+        backfill_after, backfill_before = backfill or (None, None)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watches (key, watermark, videos, best, updated_at, backfill_after,"
+                " backfill_before) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, watermark, json.dumps([dict(video) for video in videos]),
+                 json.dumps(best) if best is not None else None, time.time(), backfill_after, backfill_before)
+            )
+            self._conn.commit()
+
+def merge_candidates(old_videos, new_videos, query, max_results, oldest_timestamp,
+                     dedupe_threshold=DEFAULT_DEDUPE_THRESHOLD):
+    """
+    Merge newly found videos into a stored candidate set
+
+    Videos that fell out of the days_ago window are dropped, new details replace
+    old ones, reuploads across runs are collapsed (unless dedupe_threshold is None),
+    and the set is trimmed to the max_results best locally ranked videos.
+
+    Returns:
+        list: Merged candidate videos
+    """
+    merged = {video['id']: video for video in old_videos if parse_timestamp(video['published']) >= oldest_timestamp}
+    merged.update((video['id'], dict(video)) for video in new_videos)
+    videos = list(merged.values())
+    if dedupe_threshold:
+        videos = collapse_duplicates(videos, dedupe_threshold)
+    return rank_videos(videos, query, top_k=max_results)
+
+def refresh_query(query, config, store, options, analyze, now=None, video_store=None):
+    """
+    Bring one watched query up to date
+
+    Only videos published after the query's watermark (less WATERMARK_OVERLAP)
+    are requested, newest first, and the watermark moves to the newest one fetched.
+    When the quota budget cuts that search short, the older part it did not reach
+    is kept as a backfill range that later runs read (with publishedBefore) until
+    it is done. The analysis runs again only if the candidate set changed.
+
+    Args:
+        query (str): Search query
+        config (dict): Loaded configuration
+        store (WatchStore): Watch state
+        options (dict): Search filters (max_results, min_duration, max_duration, days_ago, min_views)
+        analyze (callable): analyze(videos, query) returning the best video
+        now (float): Current time as epoch seconds (defaults to time.time())
+        video_store (VideoStore): Optional details store shared by every refresh
+
+    Returns:
+        dict: Result record with 'new' (videos published after the previous watermark or
+            found in the backfill range) and 'changed'
+    """
+    now = now or time.time()
+    dedupe_threshold = config.get("dedupe_threshold", DEFAULT_DEDUPE_THRESHOLD)
+    key = make_cache_key(query, options['max_results'], options['min_duration'], options['max_duration'],
+                         options['days_ago'], options['min_views'])
+    state = store.get(key)
+    oldest = now - options['days_ago'] * 86400
+    watermark = state['watermark'] if state else oldest
+    since = max(oldest, watermark - WATERMARK_OVERLAP) if state else oldest
+
+    def search(published_after, published_before=None):
+        stats = {}
+        videos = search_youtube(
+            query=query,
+            api_key=config["youtube_api_key"],
+            video_store=video_store,
+            quota_budget=config.get("search_quota_budget", DEFAULT_QUOTA_BUDGET),
+            key_pool=key_pool_from_config(config, "youtube"),
+            published_after=format_timestamp(published_after),
+            published_before=format_timestamp(published_before) if published_before is not None else None,
+            dedupe_threshold=dedupe_threshold,
+            languages=config.get("search_languages", DEFAULT_LANGUAGES),
+            order='date',
+            stats=stats,
+            **{**options, 'max_results': max(options['max_results'], INCREMENTAL_MAX_RESULTS)}
+        )
+        return videos, stats
+
+    found, stats = search(since)
+    new_ids = {video['id'] for video in found if not state or parse_timestamp(video['published']) > watermark}
+    if stats['newest_published'] is not None:
+        watermark = max(watermark, stats['newest_published'])
+
+    # Carry on reading the range an earlier run did not reach
+    backfill = state['backfill'] if state else None
+    if backfill is not None and max(backfill[0], oldest) < backfill[1]:
+        after, before = max(backfill[0], oldest), backfill[1]
+        # One second past the bound so videos published in the same second are not missed
+        older, older_stats = search(after, before + 1)
+        found = found + older
+        new_ids.update(video['id'] for video in older if parse_timestamp(video['published']) < before)
+        if older_stats['exhausted']:
+            backfill = None
+        elif older_stats['oldest_published'] is not None:
+            backfill = (after, older_stats['oldest_published'])
+    else:
+        backfill = None
+
+    # Results come newest first, so a search cut short missed the oldest part of its range
+    if not stats['exhausted'] and stats['oldest_published'] is not None:
+        backfill = (backfill[0] if backfill else since, stats['oldest_published'])
+
+    old_videos = state['videos'] if state else []
+    old_ids = {video['id'] for video in old_videos}
+    videos = merge_candidates(old_videos, found, query, options['max_results'], oldest, dedupe_threshold)
+    changed = state is None or {video['id'] for video in videos} != old_ids
+
+    best = state['best'] if state else None
+    if videos and (changed or best is None):
+        best = analyze(videos, query)
+    elif not videos:
+        best = None
+
+    store.save(key, watermark, videos, best, backfill)
+    return {
+        'query': query,
+        'new': len(new_ids),
+        'changed': changed,
+        'videos': len(videos),
+        'best': best
+    }
+
+def run_watch(queries, config, options, interval=DEFAULT_INTERVAL, runs=None, output=None, use_llm=True,
+              store=None, reload_config=False):
+    """
+    Re-run queries every `interval` seconds, writing one JSON line per query and run
+
+    Args:
+        queries (list): Search queries
+        config (dict): Loaded configuration
+        options (dict): Search filters (max_results, min_duration, max_duration, days_ago, min_views)
+        interval (float): Seconds between the start of two runs
+        runs (int): Stop after this many runs (None to watch until interrupted)
+        output: Writable text stream (defaults to stdout)
+        use_llm (bool): Analyze with Gemini; if False, pick videos by local ranking only
+        store (WatchStore): Watch state (defaults to the one in the cache directory)
+        reload_config (bool): Re-read config.json before each run so API keys added while
+            watching are used
+    """
+    output = output or sys.stdout
+    store = store or WatchStore()
+    # Opened once so their connections and in-memory tiers last across runs
+    verdict_cache = verdict_cache_from_config(config)
+    video_store = store_from_config(config)
+
+    def analyze(videos, query):
+        if not use_llm:
+            return best_local_video(videos, query)
+        return analyze_titles_tournament(
+            videos=videos,
+            query=query,
+            api_key=config["gemini_api_key"],
+            top_k=config.get("llm_top_k", DEFAULT_TOP_K),
+            shard_size=config.get("llm_shard_size", DEFAULT_SHARD_SIZE),
+            max_workers=config.get("llm_parallelism", DEFAULT_PARALLELISM),
+            token_budget=config.get("llm_prompt_token_budget", DEFAULT_PROMPT_TOKEN_BUDGET),
+            verdict_cache=verdict_cache,
+            key_pool=key_pool_from_config(config, "gemini")
+        )
+
+    completed = 0
+    while runs is None or completed < runs:
+        started = time.monotonic()
+        if reload_config:
+            config = load_config() or config
+        for query in queries:
+            try:
+                record = refresh_query(query, config, store, options, analyze, video_store=video_store)
+            except Exception as e:
+                record = {'query': query, 'error': str(e)}
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+        completed += 1
+        if runs is None or completed < runs:
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
@@ -0,0 +1,95 @@
+"""
+YouTube API client registry
+Reuses API clients across searches and loads the discovery document only once
+"""
+import os
+import json
+import threading
+from config_manager import CACHE_DIR
+
+DISCOVERY_CACHE_FILE = os.path.join(CACHE_DIR, "youtube_v3_discovery.json")
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest"
+
+_discovery_document = None
+_discovery_lock = threading.Lock()
+_local = threading.local()
+_generation = 0
+
+def load_discovery_document():
+    """
+    Load and parse the YouTube v3 discovery document once per process
+
+    The copy bundled with google-api-python-client is used when available,
+    otherwise a copy saved under the cache directory (downloaded on first use).
+
+    Returns:
+        dict: Parsed discovery document
+    """
+    global _discovery_document
+    with _discovery_lock:
+        if _discovery_document is None:
+            # googleapiclient is imported on first use to keep startup fast
+            from googleapiclient import discovery
+            from googleapiclient.discovery_cache import get_static_doc
+            content = get_static_doc('youtube', 'v3')
+            if content is None and os.path.exists(DISCOVERY_CACHE_FILE):
+                with open(DISCOVERY_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            if content is None:
+                _, body = discovery.build_http().request(DISCOVERY_URL)
+                content = body.decode('utf-8')
+                os.makedirs(os.path.dirname(DISCOVERY_CACHE_FILE), exist_ok=True)
+                with open(DISCOVERY_CACHE_FILE, 'w', encoding='utf-8') as f:
+                    f.write(content)
+            _discovery_document = json.loads(content)
+        return _discovery_document
+
+def get_client(api_key):
+    """
+    Get a YouTube API client for an API key, building it on first use
+
+    httplib2 connections are not thread-safe, so each thread keeps its own
+    client per key; the client and its keep-alive connection are reused for
+    every later call on that thread.
+
+    Args:
+        api_key (str): YouTube API key
+
+    Returns:
+        googleapiclient.discovery.Resource: YouTube v3 client
+    """
+    if getattr(_local, 'generation', None) != _generation:
+        _local.clients = {}
+        _local.generation = _generation
+
+    client = _local.clients.get(api_key)
+    if client is None:
+        from googleapiclient import discovery
+        client = discovery.build_from_document(
+            load_discovery_document(),
+            developerKey=api_key,
+            http=discovery.build_http()
+        )
+        _local.clients[api_key] = client
+    return client
+
+def get_http():
+    """
+    Get this thread's HTTP connection for executing API requests
+
+    Requests retried or hedged by a call policy run on worker threads, so they
+    must not share the connection of the client that built them.
+
+    Returns:
+        httplib2.Http: Connection reused by every request on the current thread
+    """
+    if getattr(_local, 'http_generation', None) != _generation:
+        from googleapiclient import discovery
+        _local.http = discovery.build_http()
+        _local.http_generation = _generation
+    return _local.http
+
+def clear_clients():
+    """Drop all cached clients and connections so the next calls build new ones"""
+    global _generation
+    _generation += 1
@@ -2,11 +2,30 @@
 YouTube search module
 Handles searching YouTube videos with filters for duration and upload date
 """
+import math
+import time
 import datetime
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from search_cache import make_cache_key
+from youtube_client import get_client, get_http
+from metrics import metrics
+from video_record import VideoColumns, parse_duration_seconds
+from resilience import get_policy, quota_error_kind, CircuitOpenError
+from dedupe import DuplicateIndex, preferred, DEFAULT_DEDUPE_THRESHOLD
 
-def search_youtube(query, api_key, max_results=20, min_duration=240, max_duration=1200, days_ago=14):
+MAX_PAGE_SIZE = 50  # API limit for search maxResults and videos ids per call
+SEARCH_QUOTA_COST = 100  # Quota units per search().list call
+VIDEOS_QUOTA_COST = 1  # Quota units per videos().list call
+DEFAULT_QUOTA_BUDGET = 500
+DEFAULT_LANGUAGES = ('en',)
+
+@metrics.timed('search_youtube')
+def search_youtube(query, api_key, max_results=20, min_duration=240, max_duration=1200, days_ago=14,
+                   cache=None, video_store=None, quota_budget=DEFAULT_QUOTA_BUDGET, on_video=None, min_views=0,
+                   policy=None, key_pool=None, on_page=None, published_after=None,
+                   dedupe_threshold=DEFAULT_DEDUPE_THRESHOLD, local_first=False, languages=DEFAULT_LANGUAGES,
+                   quota_scheduler=None, on_replace=None, order='relevance', stats=None, published_before=None):
     """
     Search YouTube for videos matching query with filtering
     
@@ -17,101 +36,369 @@ def search_youtube(query, api_key, max_results=20, min_duration=240, max_duratio
         min_duration (int): Minimum video duration in seconds
         max_duration (int): Maximum video duration in seconds
         days_ago (int): Only include videos published in the last X days
+        cache (SearchCache): Optional result cache; hits skip the API entirely
+        video_store (VideoStore): Optional details store; known videos only refresh statistics
+        quota_budget (int): Stop paging once this many quota units would be exceeded (None for no limit);
+            only as many languages are searched as one page of the budget covers
+        on_video (callable): Called with each video as soon as it passes the filters, unless it
+            is a near-duplicate of a video already found
+        min_views (int): Only include videos with at least this many views
+        policy (CallPolicy): Deadline, retry, hedging and circuit breaker settings
+            (defaults to the shared 'youtube' policy)
+        key_pool (KeyPool): Optional pool of API keys used instead of api_key; each page uses
+            the key with the most quota left, and keys that run out are rotated out
+        on_page (callable): Called with the videos found so far each time another page
+            is about to be fetched, so they can be processed while it loads
+        published_after (str): RFC 3339 timestamp; only include videos published after it
+            instead of using days_ago (results are then not cached)
+        dedupe_threshold (float): Title similarity at which a video counts as a reupload of one
+            already found; only the copy with more views (or the earlier upload) is kept.
+            None keeps every video.
+        local_first (bool): Answer from videos in video_store matching every query word before
+            calling the API; the API is only paged for the slots they do not fill
+        languages (list): Relevance languages to search, optionally with a region (e.g. 'hi-IN');
+            with several, each page is searched for all of them at once and their results merged
+        quota_scheduler (QuotaScheduler): Optional daily budget; each page reserves its cost just
+            before it is fetched and paging stops when the budget refuses (cache and local hits cost nothing)
+        on_replace (callable): Called with (old, new) when a later near-duplicate is the better
+            copy and takes the place of a video already passed to on_video
+        order (str): Search result order ('relevance', or 'date' for newest first)
+        stats (dict): Optional dictionary whose 'exhausted' entry is set to True if the search
+            read every result page, and False if it stopped early (results, budget or error);
+            'oldest_published' / 'newest_published' are the earliest and latest publish times
+            (epoch seconds) of the videos fetched, or None if none were
+        published_before (str): RFC 3339 timestamp; only include videos published before it
     
     Returns:
-        list: List of video dictionaries with metadata
+        list: List of VideoRecord objects (cached results are plain dictionaries). If the API
+            fails, a stale cached result or the videos found before the failure are returned.
     """
+    cache_key = None
+    languages = list(languages or DEFAULT_LANGUAGES)
+    incremental = published_after is not None
+    if incremental:
+        cache = None  # The cache key only covers the days_ago window
+    if cache is not None:
+        cache_key = make_cache_key(query, max_results, min_duration, max_duration, days_ago, min_views, languages)
+        cached_videos = cache.get(cache_key)
+        metrics.count('search_cache_requests_total', result='miss' if cached_videos is None else 'hit')
+        if cached_videos is not None:
+            if on_video is not None:
+                for video in cached_videos:
+                    on_video(video)
+            return cached_videos
+    
+    policy = policy or get_policy('youtube')
+    result_videos = []
+    if stats is not None:
+        stats['exhausted'] = False
+        stats['oldest_published'] = None
+        stats['newest_published'] = None
     try:
         # Calculate the date for filtering
-        published_after = (datetime.datetime.now() - datetime.timedelta(days=days_ago)).isoformat() + "Z"
+        if published_after is None:
+            published_after = (datetime.datetime.now() - datetime.timedelta(days=days_ago)).isoformat() + "Z"
         
-        # Create YouTube API client
-        youtube = build('youtube', 'v3', developerKey=api_key)
+        # Reuse the YouTube API client for this key
+        youtube = get_client(api_key) if key_pool is None else None
         
-        # Initial search to get video IDs
-        search_response = youtube.search().list(
-            q=query,
-            part='id',
-            maxResults=max_results * 2,  # Get more than needed to allow for filtering
-            type='video',
-            publishedAfter=published_after,
-            relevanceLanguage='en'  # Focus on English results but will still return other languages
-        ).execute()
+        # Every language costs a search call per page, so search only as many as one page's budget covers
+        language_cost = SEARCH_QUOTA_COST + VIDEOS_QUOTA_COST
+        if quota_budget is not None and len(languages) > 1 and len(languages) * language_cost > quota_budget:
+            covered = max(1, quota_budget // language_cost)
+            print(f"Warning: a quota budget of {quota_budget} units only covers {covered} of "
+                  f"{len(languages)} search languages; searching {', '.join(languages[:covered])}")
+            languages = languages[:covered]
         
-        video_ids = [item['id']['videoId'] for item in search_response.get('items', [])]
-        if not video_ids:
-            return []
-            
-        # Get video details including duration
-        videos_response = youtube.videos().list(
-            part='snippet,contentDetails,statistics',
-            id=','.join(video_ids)
-        ).execute()
+        seen_ids = set()
+        page_tokens = {language: None for language in languages}  # languages with pages left
+        out_of_quota = False  # no call was possible or the keys ran out; not worth caching
+        quota_used = 0
+        checked_count = 0
+        passed_count = 0
+        duplicates = DuplicateIndex(dedupe_threshold) if dedupe_threshold else None
         
-        # Process and filter videos
-        result_videos = []
-        for item in videos_response.get('items', []):
-            # Parse duration in ISO 8601 format
-            duration_str = item['contentDetails']['duration']
-            duration_seconds = parse_duration(duration_str)
-            
-            # Filter by duration
-            if min_duration <= duration_seconds <= max_duration:
-                # Format the data
-                video_data = {
-                    'id': item['id'],
-                    'title': item['snippet']['title'],
-                    'channel': item['snippet']['channelTitle'],
-                    'published': item['snippet']['publishedAt'],
-                    'duration': round(duration_seconds / 60, 1),  # Convert to minutes
-                    'views': item['statistics'].get('viewCount', '0'),
-                    'thumbnail': item['snippet']['thumbnails']['high']['url']
-                }
-                result_videos.append(video_data)
-                
-                # Stop if we have enough videos
+        def accept(page, indices):
+            """Add the matching videos of a page to the results; returns how many were new"""
+            added = 0
+            for video in page.records(indices):
                 if len(result_videos) >= max_results:
                     break
+                # A near-duplicate of a video already found only replaces it if it is the better copy
+                if duplicates is not None:
+                    position = duplicates.find(video)
+                    if position is not None:
+                        metrics.count('search_duplicates_collapsed_total')
+                        if preferred(video, result_videos[position]):
+                            if on_replace is not None:
+                                on_replace(result_videos[position], video)
+                            result_videos[position] = video
+                        continue
+                    duplicates.add(len(result_videos), video)
+                added += 1
+                result_videos.append(video)
+                if on_video is not None:
+                    on_video(video)
+            return added
+        
+        # Start from fresh stored videos; their IDs are skipped if search returns them again
+        if local_first and video_store is not None and not incremental:
+            local = video_store.search(query, min_duration, max_duration, time.time() - days_ago * 86400,
+                                       min_views, limit=max_results)
+            page = VideoColumns(local)
+            accept(page, range(len(local)))
+            seen_ids.update(video['id'] for video in local)
+            metrics.count('search_local_requests_total',
+                          result='hit' if len(result_videos) >= max_results else 'partial' if local else 'miss')
+
+        # Page through search results until we have enough videos or run out of budget
+        while len(result_videos) < max_results:
+            page_size = estimate_page_size(max_results - len(result_videos), checked_count, passed_count)
+            # One search call per language and at most one videos call per 50 of their results
+            page_cost = language_cost * len(page_tokens)
+            if quota_budget is not None and quota_used + page_cost > quota_budget:
+                out_of_quota = quota_used == 0
+                break
+            
+            # Each page goes to the pooled key with the most quota left
+            if key_pool is not None:
+                api_key = key_pool.acquire(page_cost)
+                if api_key is None:
+                    print("YouTube API error: every API key is out of quota")
+                    out_of_quota = True
+                    break
+                youtube = get_client(api_key)
+            
+            if quota_scheduler is not None and not quota_scheduler.reserve(page_cost):
+                print("YouTube API error: the daily quota budget is used up")
+                out_of_quota = True
+                break
+            
+            try:
+                video_ids, details, next_page_tokens = search_page(
+                    youtube, query, page_size, published_after, page_tokens, seen_ids, video_store, policy, order,
+                    published_before
+                )
+            except Exception as e:
+                # Refused requests cost no quota
+                kind = quota_error_kind(e)
+                if quota_scheduler is not None and kind is not None:
+                    quota_scheduler.refund(page_cost)
+                # Retry the same page with another key when this one ran out of quota
+                if key_pool is None or kind is None:
+                    raise
+                key_pool.report_exhausted(api_key, daily=kind == 'daily')
+                metrics.count('api_key_rotations_total', service='youtube', reason=kind)
+                continue
+            quota_used += page_cost
+            seen_ids.update(video_ids)
+            checked_count += len(details)
+            
+            # Filter the whole page at once on parsed duration and view count columns
+            page = VideoColumns(details)
+            passed_count += accept(page, page.matching(min_duration, max_duration, min_views))
+            if stats is not None and details:
+                oldest, newest = float(page.published.min()), float(page.published.max())
+                if stats['oldest_published'] is None or oldest < stats['oldest_published']:
+                    stats['oldest_published'] = oldest
+                if stats['newest_published'] is None or newest > stats['newest_published']:
+                    stats['newest_published'] = newest
+
+            page_tokens = next_page_tokens
+            if not page_tokens:
+                if stats is not None:
+                    stats['exhausted'] = True
+                break
+            if on_page is not None and len(result_videos) < max_results:
+                on_page(list(result_videos))
+        
+        # An empty or cut-short result caused by quota would hide the real one until it expires
+        if cache is not None and not out_of_quota:
+            cache.set(cache_key, result_videos)
         
         return result_videos
         
-    except HttpError as e:
-        print(f"YouTube API error: {e}")
-        return []
     except Exception as e:
-        print(f"Error searching YouTube: {e}")
-        return []
+        # Imported here so startup does not pay for googleapiclient
+        from googleapiclient.errors import HttpError
+        if isinstance(e, CircuitOpenError):
+            print(f"YouTube API unavailable: {e}")
+        elif isinstance(e, HttpError):
+            print(f"YouTube API error: {e}")
+        else:
+            print(f"Error searching YouTube: {e}")
+        
+        # Serve an expired cached result rather than nothing
+        stale_videos = cache.get_stale(cache_key) if cache is not None else None
+        if stale_videos:
+            metrics.count('search_fallback_total', source='stale_cache')
+            return stale_videos
+        if result_videos:
+            metrics.count('search_fallback_total', source='partial')
+        return result_videos
 
-def parse_duration(duration_str):
+def search_page(youtube, query, page_size, published_after, page_tokens, seen_ids, video_store, policy,
+                order='relevance', published_before=None):
     """
-    Parse ISO 8601 duration format (PT#H#M#S) to seconds
-    Example: PT1H22M33S => 1 hour, 22 minutes, 33 seconds
+    Fetch one page of search results per language and the details of their new videos
+    
+    With several languages the searches run concurrently. Their IDs are merged
+    (interleaved, so every language is represented) and looked up in one videos pass.
     
     Args:
-        duration_str (str): Duration string in ISO 8601 format
+        page_tokens (dict): Language => page token (None for the first page) of each language to search
+    
+    Returns:
+        tuple: (new video IDs, detail dictionaries, page tokens of the languages with more pages)
+    """
+    languages = list(page_tokens)
+    per_language = max(1, math.ceil(page_size / len(languages)))
+    
+    def search(language):
+        relevance_language, _, region = language.partition('-')
+        params = dict(
+            q=query,
+            part='id',
+            maxResults=per_language,
+            type='video',
+            order=order,
+            publishedAfter=published_after,
+            relevanceLanguage=relevance_language,  # Favours the language but will still return others
+            pageToken=page_tokens[language]
+        )
+        if region:
+            params['regionCode'] = region.upper()
+        if published_before is not None:
+            params['publishedBefore'] = published_before
+        # Not hedged: a duplicate search call would cost another 100 quota units
+        with metrics.span('youtube.search'):
+            response = execute(youtube.search().list(**params), policy, hedge=False)
+        metrics.count_quota('search')
+        return response
+    
+    if len(languages) == 1:
+        responses = [search(languages[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(languages)) as executor:
+            responses = list(executor.map(search, languages))
+    
+    video_ids = []
+    merged = set(seen_ids)
+    result_ids = [[item['id']['videoId'] for item in response.get('items', [])] for response in responses]
+    for video_id in itertools.chain.from_iterable(itertools.zip_longest(*result_ids)):
+        if video_id is not None and video_id not in merged:
+            merged.add(video_id)
+            video_ids.append(video_id)
+    
+    # Get video details including duration
+    details = fetch_video_details(youtube, video_ids, video_store, policy)
+    next_tokens = {
+        language: response['nextPageToken']
+        for language, response in zip(languages, responses) if response.get('nextPageToken')
+    }
+    return video_ids, details, next_tokens
+
+def estimate_page_size(needed, checked_count, passed_count):
+    """
+    Estimate how many search results to request to fill the remaining slots
+    
+    Uses the share of videos that passed the filters on earlier pages, starting
+    from an assumed pass rate of one half before any page has been seen.
+    
+    Args:
+        needed (int): Number of videos still needed
+        checked_count (int): Videos checked against the filters so far
+        passed_count (int): Distinct videos that passed the filters so far
         
     Returns:
-        int: Duration in seconds
+        int: Page size between 1 and MAX_PAGE_SIZE
+    """
+    pass_rate = (passed_count + 1) / (checked_count + 2)
+    return max(1, min(MAX_PAGE_SIZE, math.ceil(needed / pass_rate)))
+
+def execute(request, policy, hedge=True):
+    """Execute an API request under a call policy, each attempt on its worker thread's own connection"""
+    return policy.call(lambda: request.execute(http=get_http()), hedge=hedge)
+
+def chunked(items, size):
+    """Split a list into consecutive chunks of at most `size` items"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def fetch_video_details(youtube, video_ids, video_store=None, policy=None):
     """
-    duration_str = duration_str[2:]  # Remove PT prefix
+    Fetch details for a list of video IDs, reusing stored metadata where possible
     
-    hours = 0
-    minutes = 0
-    seconds = 0
+    Unknown IDs are requested with snippet, contentDetails and statistics. IDs already
+    in the store only have statistics re-fetched, and only once those are stale.
     
-    # Extract hours
-    if 'H' in duration_str:
-        hours_str, duration_str = duration_str.split('H')
-        hours = int(hours_str)
+    Args:
+        youtube: YouTube API client
+        video_ids (list): Video IDs to look up
+        video_store (VideoStore): Optional details store
+        policy (CallPolicy): Call policy (defaults to the shared 'youtube' policy)
+        
+    Returns:
+        list: Detail dictionaries (see video_store.FIELDS) in the order of video_ids
+    """
+    policy = policy or get_policy('youtube')
+    known = video_store.get_many(video_ids) if video_store is not None else {}
+    unknown_ids = [video_id for video_id in video_ids if video_id not in known]
+    stale_ids = [video_id for video_id, detail in known.items() if video_store.is_stale(detail)]
+    
+    new_details = {}
+    for id_chunk in chunked(unknown_ids, MAX_PAGE_SIZE):
+        videos_request = youtube.videos().list(
+            part='snippet,contentDetails,statistics',
+            id=','.join(id_chunk)
+        )
+        with metrics.span('youtube.videos'):
+            videos_response = execute(videos_request, policy)
+        metrics.count_quota('videos')
+        for item in videos_response.get('items', []):
+            new_details[item['id']] = {
+                'id': item['id'],
+                'title': item['snippet']['title'],
+                'channel': item['snippet']['channelTitle'],
+                'published': item['snippet']['publishedAt'],
+                'duration_seconds': parse_duration(item['contentDetails']['duration']),
+                'views': item['statistics'].get('viewCount', '0'),
+                'thumbnail': item['snippet']['thumbnails']['high']['url']
+            }
     
-    # Extract minutes
-    if 'M' in duration_str:
-        minutes_str, duration_str = duration_str.split('M')
-        minutes = int(minutes_str)
+    refreshed_views = {}
+    for id_chunk in chunked(stale_ids, MAX_PAGE_SIZE):
+        stats_request = youtube.videos().list(
+            part='statistics',
+            id=','.join(id_chunk)
+        )
+        with metrics.span('youtube.videos'):
+            stats_response = execute(stats_request, policy)
+        metrics.count_quota('videos')
+        for item in stats_response.get('items', []):
+            refreshed_views[item['id']] = item['statistics'].get('viewCount', '0')
+            known[item['id']]['views'] = refreshed_views[item['id']]
+    if refreshed_views:
+        video_store.update_statistics(refreshed_views)
     
-    # Extract seconds
-    if 'S' in duration_str:
-        seconds_str = duration_str.split('S')[0]
-        seconds = int(seconds_str)
+    if video_store is not None and new_details:
+        video_store.save(list(new_details.values()))
+    
+    details = []
+    for video_id in video_ids:
+        detail = new_details.get(video_id) or known.get(video_id)
+        if detail is not None:
+            details.append(detail)
+    return details
+
+def parse_duration(duration_str):
+    """
+    Parse ISO 8601 duration format (PT#H#M#S) to seconds
+    Example: PT1H22M33S => 1 hour, 22 minutes, 33 seconds
     
-    return hours * 3600 + minutes * 60 + seconds 
\ No newline at end of file
+    Args:
+        duration_str (str): Duration string in ISO 8601 format
+        
+    Returns:
+        int: Duration in seconds
+    """
+    return parse_duration_seconds(duration_str)